@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+# -------------------------------------------------------------------------------
+# Import additional Python functionality / various libraries
+# -------------------------------------------------------------------------------
+
+import hashlib
+import io
+import json
+from datetime import datetime, timezone
+
+import pandas as pd
+import flask
+
+# pyarrow is optional: without it, the API serves JSON only
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+"""
+Read-only HTTP routes that serve the dataframes of the hosted data bundles, for downstream (bulk) consumers.
+
+The routes are registered on the dashboard's own Flask server ("server = app.server" in BOE_Dash.py):
+    GET /api/datasets                   - the hosted datasets (see "BOE_Registry.py")
+    GET /api/frames                     - the available frames, with their series and period ranges
+    GET /api/frames/<frame name>        - one frame, optionally filtered:
+            ?series=GDP_Total_MarketPrices,GDP_Component_GFCF    (comma separated; default: all series)
+            &start=1990&end=2000                                 (any date pandas understands; default: all periods;
+                                                                  only for frames indexed by date, else "400")
+            &format=arrow | json                                 (default: Arrow IPC if the Accept header asks for it)
+Both /api/frames routes take an optional "dataset" parameter (e.g. ?dataset=uk); by default, the first dataset is used.
+
+Frames are returned in a columnar format: Arrow IPC streams (media type "application/vnd.apache.arrow.stream", \
+when pyarrow is installed) or JSON of the form {"index": [...], "columns": {"series": [...]}}.
+Every response carries an ETag and Last-Modified header derived from the bundle version, so clients and \
+proxies can cache responses and revalidate them cheaply: a "304 Not Modified" is answered before the frame is \
+filtered or serialised, so it costs next to nothing.
+"""
+
+ARROW_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+
+# How long (in seconds) clients and proxies may re-use a response before revalidating it
+CACHE_MAX_AGE = 300
+
+# -------------------------------------------------------------------------------
+# Define helper functions that find, filter and serialise the frames of a bundle
+# -------------------------------------------------------------------------------
+
+def bundle_frames(data_bundle):
+    # Every dataframe in the bundle, by name. Rolled-up frames are named e.g. "df_GDP_annual".
+    frames = {name: value for name, value in data_bundle.items() if isinstance(value, pd.DataFrame)}
+    for resolution, rollup in (data_bundle.get('rollups') or {}).items():
+        for name, value in rollup.items():
+            if isinstance(value, pd.DataFrame):
+                frames[f'{name}_{resolution}'] = value
+    return frames
+
+def unknown_series(df, series):
+    return [name for name in series if name not in df.columns]
+
+def has_period_index(df):
+    # Frames indexed by date (quarters, or the start of each rolled-up period) can be filtered by period
+    return isinstance(df.index, (pd.DatetimeIndex, pd.PeriodIndex))
+
+def filter_frame(df, series=None, start=None, end=None):
+    if series:
+        df = df[series]
+    return df.loc[start:end]
+
+def frame_to_arrow(df):
+    table = pa.Table.from_pandas(df.reset_index(), preserve_index=False)
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+def frame_to_json(df):
+    # Columnar JSON: one list of values per series (missing values become null)
+    index = df.index.strftime('%Y-%m-%d').tolist() if isinstance(df.index, pd.DatetimeIndex) else df.index.tolist()
+    columns = {str(column): [None if pd.isna(value) else value for value in df[column].tolist()]
+               for column in df.columns}
+    return json.dumps({'index_name': df.index.name, 'index': index, 'columns': columns})
+
+def json_error(message, status):
+    return flask.Response(json.dumps({'error': message}), status=status, mimetype='application/json')
+
+# -------------------------------------------------------------------------------
+# Define the function that registers the routes on a Flask server
+# -------------------------------------------------------------------------------
+
+def register_data_api(server, registry):
+    """
+    "registry" is the dashboard's DatasetRegistry. Each dataset's "version" changes whenever its bundle changes \
+    (it is used to build the ETag of every response).
+    """
+
+    def get_dataset():
+        # The dataset named in the request's "dataset" parameter (or None, if there is no such dataset)
+        dataset_id = flask.request.args.get('dataset')
+        if dataset_id is not None and dataset_id not in registry.dataset_ids():
+            return None
+        return registry.get(dataset_id)
+
+    def cache_validators(version, last_modified, mimetype):
+        # The ETag and Last-Modified of a response depend only on the bundle version, the request and the media type,
+        # so they are known before the (possibly large) body is built
+        etag = hashlib.sha1(f'{version}|{flask.request.full_path}|{mimetype}'.encode('utf-8')).hexdigest()
+        return etag, datetime.fromtimestamp(int(last_modified), tz=timezone.utc)
+
+    def cacheable(response, etag, last_modified):
+        # Attach the caching headers to a response (a full response, or a "304 Not Modified")
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response.cache_control.public = True
+        response.cache_control.max_age = CACHE_MAX_AGE
+        response.vary.add('Accept')
+        return response
+
+    def not_modified(etag, last_modified):
+        # A "304 Not Modified" if the client's copy is current (checked before any of the body is built), else None
+        request = flask.request
+        if request.if_none_match:
+            current = request.if_none_match.contains_weak(etag)
+        elif request.if_modified_since is not None:
+            current = last_modified <= request.if_modified_since
+        else:
+            current = False
+        return cacheable(flask.Response(status=304), etag, last_modified) if current else None
+
+    @server.route('/api/datasets')
+    def list_datasets():
+        datasets = [{'id': dataset_id, 'label': registry.label(dataset_id)} for dataset_id in registry.dataset_ids()]
+        return flask.Response(json.dumps({'datasets': datasets}), mimetype='application/json')
+
+    @server.route('/api/frames')
+    def list_frames():
+        dataset = get_dataset()
+        if dataset is None:
+            return json_error(f"Unknown dataset: {flask.request.args.get('dataset')}", 404)
+        etag, last_modified = cache_validators(dataset.version, dataset.last_modified, 'application/json')
+        response = not_modified(etag, last_modified)
+        if response is not None:
+            return response
+        frames = {}
+        for name, df in bundle_frames(dataset.bundle).items():
+            periods = df.index.strftime('%Y-%m-%d') if isinstance(df.index, pd.DatetimeIndex) else df.index.astype(str)
+            frames[name] = {'series': [str(column) for column in df.columns],
+                            'rows': len(df),
+                            'start': periods[0] if len(df) else None,
+                            'end': periods[-1] if len(df) else None}
+        response = flask.Response(json.dumps({'dataset': dataset.id, 'version': dataset.version, 'frames': frames}),
+                                  mimetype='application/json')
+        return cacheable(response, etag, last_modified)
+
+    @server.route('/api/frames/<frame_name>')
+    def get_frame(frame_name):
+        dataset = get_dataset()
+        if dataset is None:
+            return json_error(f"Unknown dataset: {flask.request.args.get('dataset')}", 404)
+        frames = bundle_frames(dataset.bundle)
+        if frame_name not in frames:
+            return json_error(f"Unknown frame: {frame_name}", 404)
+
+        args = flask.request.args
+        series = [name for name in args.get('series', '').split(',') if name]
+        unknown = unknown_series(frames[frame_name], series)
+        if unknown:
+            return json_error(f"Unknown series: {', '.join(unknown)}", 400)
+        # Periods can only be selected in frames indexed by date (e.g. not df_treemap, whose rows are components)
+        start, end = args.get('start'), args.get('end')
+        if (start is not None or end is not None) and not has_period_index(frames[frame_name]):
+            return json_error(f"Frame {frame_name} is not indexed by period; start / end cannot be applied", 400)
+
+        # Serve Arrow IPC if it was asked for (explicitly, or in the Accept header), falling back to JSON
+        requested_format = args.get('format')
+        if requested_format is None:
+            accepts_arrow = any(media_type == ARROW_MEDIA_TYPE for media_type, _ in flask.request.accept_mimetypes)
+            requested_format = 'arrow' if accepts_arrow and pa is not None else 'json'
+        if requested_format == 'arrow' and pa is None:
+            return json_error("Arrow format is unavailable (pyarrow is not installed); use format=json", 406)
+        if requested_format not in ('arrow', 'json'):
+            return json_error(f"Unknown format: {requested_format}", 400)
+
+        # If the client's copy is current, answer "304 Not Modified" without filtering or serialising the frame
+        mimetype = ARROW_MEDIA_TYPE if requested_format == 'arrow' else 'application/json'
+        etag, last_modified = cache_validators(dataset.version, dataset.last_modified, mimetype)
+        response = not_modified(etag, last_modified)
+        if response is not None:
+            return response
+
+        try:
+            df = filter_frame(frames[frame_name], series, start, end)
+        except (KeyError, ValueError, TypeError) as e:
+            return json_error(f"Invalid period range: {e}", 400)
+
+        if requested_format == 'arrow':
+            response = flask.Response(frame_to_arrow(df), mimetype=mimetype)
+        else:
+            response = flask.Response(frame_to_json(df), mimetype=mimetype)
+
+        return cacheable(response, etag, last_modified)
@@ -8,11 +8,12 @@
 # Import additional Python functionality / various libraries
 # -------------------------------------------------------------------------------
 
+import os
+import functools
 import pandas as pd
 import numpy as np
 import seaborn as sns
 import matplotlib.pyplot as plt
-import pickle
 from scipy.stats import zscore
 import plotly.express as px
 import plotly.graph_objs as go
@@ -21,31 +22,128 @@ import plotly.offline as pyo
 import dash
 import dash_bootstrap_components as dbc
 import dash_mantine_components as dmc
-from dash import Dash, html, dash_table, dcc, callback, Output, Input
+from dash import Dash, html, dash_table, dcc, callback, Output, Input, State, Patch, ctx, no_update
 
+# Import our own modules
+from BOE_Registry import DatasetRegistry
+from BOE_API import register_data_api
+from BOE_Search import SeriesIndex
+from BOE_Live import register_live_updates
+from BOE_Prefetch import Prefetcher
+from BOE_Vintages import VintageStore
+
+# -------------------------------------------------------------------------------
+# Load the bundles of dataframes and lists to be used in this dashboard
+# -------------------------------------------------------------------------------
+
+"""
+The dashboard can host many datasets, each a bundle created by the "BOE_Data.py" script (see "BOE_Registry.py").
+By default, the single bundle "data_bundle.pickle" is served. Bundles are loaded lazily, on first use, and the least
+recently used bundles are evicted when the memory budget is exceeded - so every callback below fetches its dataframes
+from the registry, using the dataset id selected by the user.
+"""
+registry = DatasetRegistry.from_environment()
+
+# The dataset shown when the dashboard first loads. It is used to populate the initial layout.
+default_dataset = registry.get()
+
+# Access the individual DataFrames or lists from the default dataset's bundle (used to build the initial layout)
+df_GDP = default_dataset['df_GDP']
+df_GDP_QvPriorQ = default_dataset['df_GDP_QvPriorQ']
+Household_Components = default_dataset['Household_Components']
+GDP_Components = default_dataset['GDP_Components']
+
+# -------------------------------------------------------------------------------
+# Define a function that picks the resolution at which to plot a range of years
 # -------------------------------------------------------------------------------
-# Load the bundle of dataframes and lists to be used in this dashboard
+
+# Plots of levels and shares show at most this many bars; wider ranges of years are served from the coarser rollups.
+# With the default of 160 bars, ~70 years of data only ever reach the annual rollup; a smaller budget (set by the
+# BOE_MAX_BARS_PER_PLOT environment variable, e.g. 10) brings the 5-year and 10-year rollups into use.
+max_bars_per_plot = int(os.environ.get('BOE_MAX_BARS_PER_PLOT', 160))
+
+def select_resolution(dataset, start_year, end_year, max_bars=None):
+    # Returns the name of the rollup to use (or None, meaning quarterly data), and a label for the plot title
+    max_bars = max_bars or max_bars_per_plot
+    number_of_years = int(end_year) - int(start_year) + 1
+    if number_of_years * 4 <= max_bars:
+        return None, 'Quarterly'
+    
+    # Otherwise, use the finest rollup whose number of periods fits within the limit (or the coarsest available)
+    rollups = dataset['rollups']
+    resolutions = sorted(rollups, key=lambda resolution: rollups[resolution]['years'])
+    for resolution in resolutions:
+        years = rollups[resolution]['years']
+        number_of_periods = int(end_year) // years - int(start_year) // years + 1
+        if number_of_periods <= max_bars:
+            break
+    years = rollups[resolution]['years']
+    return resolution, 'Annual' if years == 1 else f'{years}-Year'
+
+def slice_years(dataset, frame_name, start_year, end_year, columns=slice(None), max_bars=None):
+    # Slice df_GDP or df_GDPComponents_Abs to the selected years, at the resolution chosen by select_resolution
+    resolution, label = select_resolution(dataset, start_year, end_year, max_bars)
+    if resolution is None:
+        return dataset[frame_name].loc[str(start_year):str(end_year), columns], label
+    
+    # A rolled-up period is included if any part of it falls within the selected years
+    rollup = dataset['rollups'][resolution]
+    df = rollup[frame_name]
+    period_start_years = df.index.year
+    in_range = (period_start_years + rollup['years'] - 1 >= int(start_year)) & (period_start_years <= int(end_year))
+    return df.loc[in_range, columns], label
+
+# -------------------------------------------------------------------------------
+# Define a function that provides a search index over the series listed in a selector
 # -------------------------------------------------------------------------------
 
-# Load the dictionary bundle that was created in the "BOE_Data.py" script.
-with open('data_bundle.pickle', 'rb') as f:
-    loaded_data_bundle = pickle.load(f)
+# The selectors list one page of matching series at a time, so the page stays small however many series there are.
+dropdown_page_size = 50
+checklist_page_size = 10
 
-# Access the individual DataFrames or lists from the loaded dictionary bundle
-df_GDP = loaded_data_bundle['df_GDP']
-df_GDP_QvPriorY = loaded_data_bundle['df_GDP_QvPriorY']
-df_GDP_QvPriorQ = loaded_data_bundle['df_GDP_QvPriorQ']
-df_GDPComponents_Abs = loaded_data_bundle['df_GDPComponents_Abs']
-Household_Components = loaded_data_bundle['Household_Components']
-GDP_Components = loaded_data_bundle['GDP_Components']
-df_treemap = loaded_data_bundle['df_treemap']
+def series_index(dataset, selector_name, list_series):
+    # The index is built once per dataset (version) and selector (see "BOE_Search.py"), then re-used by every search.
+    # "list_series(dataset)" lists the selector's series, in display order; it is only called to build the index.
+    if ('series_index', selector_name) not in dataset.cache:
+        dataset.cache[('series_index', selector_name)] = SeriesIndex(list_series(dataset), dataset['column_mapping'])
+    return dataset.cache[('series_index', selector_name)]
+
+# -------------------------------------------------------------------------------
+# Optionally, run the heavy callbacks as background jobs
+# -------------------------------------------------------------------------------
+
+"""
+With large bundles, some callbacks (the stacked bar chart and the household line plot) can take seconds to render,
+tying up a gunicorn request worker for all of that time. Setting the BOE_BACKGROUND_CALLBACKS environment variable
+runs these callbacks as background jobs instead: each render runs in its own local worker process, with its progress
+and result held in a disk-backed cache (directory given by BOE_CALLBACK_CACHE_DIR), while the browser polls for the
+result. The request workers stay free to serve the fast callbacks.
+When the user changes an input again before a render has finished (e.g. picks another year), the browser tells the
+server which job has been superseded, and that job is cancelled.
+Background callbacks need the optional "diskcache" extra of Dash (pip install "dash[diskcache]").
+"""
+background_callback_manager = None
+if os.environ.get('BOE_BACKGROUND_CALLBACKS'):
+    try:
+        import diskcache
+        cache_dir = os.environ.get('BOE_CALLBACK_CACHE_DIR', 'callback_cache')
+        # Results are only needed until the browser collects them, so they expire after 10 minutes
+        background_callback_manager = dash.DiskcacheManager(diskcache.Cache(cache_dir), expire=600)
+    except ImportError as e:
+        print(f"Error: background callbacks need the diskcache extra of Dash ({e}); running all callbacks in the foreground.")
 
 # -------------------------------------------------------------------------------
 # Initialize our interactive dashboard app
 # -------------------------------------------------------------------------------
 
+# Live updates (see "BOE_Live.py") are opt-in: each open tab holds a server connection, which needs a threaded (or
+# async) gunicorn worker class. Without BOE_LIVE_UPDATES, the /events route, its watcher and the browser script
+# ("assets/BOE_live_updates.js") are all left out, and new bundles are picked up on the user's next request instead.
+live_updates = bool(os.environ.get('BOE_LIVE_UPDATES'))
+
 # Standard code to initialise dash dashboard (using a "dbc" style theme)
-app = dash.Dash(external_stylesheets=[dbc.themes.PULSE])
+app = dash.Dash(__name__, external_stylesheets=[dbc.themes.PULSE], background_callback_manager=background_callback_manager,
+                assets_ignore='' if live_updates else r'BOE_live_updates\.js')
 
 # this title appears in user's web browser tab, when dashboard is running
 app.title = "UK GDP Dashboard" 
@@ -53,6 +151,71 @@ app.title = "UK GDP Dashboard"
 # This line is required for the dashboard to successfully render online via render.com
 server = app.server
 
+# Serve the bundles' dataframes to downstream consumers, via read-only routes on the same server (see "BOE_API.py")
+register_data_api(server, registry)
+
+# Push new bundle versions to the connected dashboards (see "BOE_Live.py" and "assets/BOE_live_updates.js")
+if live_updates:
+    register_live_updates(server, registry, interval=float(os.environ.get('BOE_LIVE_UPDATE_INTERVAL', 5)))
+
+# When a new bundle version is pushed, the browser updates the "bundle-version" store, which triggers every figure's
+# callback. Each callback then re-renders only if the parts of the bundle it is built from have changed.
+def unchanged_by_update(dataset_id, bundle_update, keys):
+    if bundle_update is None or ctx.triggered_id != 'bundle-version':
+        return False  # Triggered by the user, as usual
+    dataset_id = dataset_id or registry.default_id
+    update = next((update for update in bundle_update['updates'] if update['dataset'] == dataset_id), None)
+    if update is None:
+        return True  # Another dataset has changed
+    changed = registry.changed_keys(dataset_id, update['previous'], update['version'])
+    return changed is not None and not set(changed) & set(keys)
+
+# Optionally, prefetch the states an analyst is likely to ask for next, into a callback cache (see "BOE_Prefetch.py").
+# Prefetching is switched on with the BOE_PREFETCH environment variable; its hit rate is reported at /prefetch-stats.
+# The prefetcher's cache, lock and threads belong to the server process, so it only serves the callbacks that run
+# there: a callback run as a background job (in a forked process) always runs uncached (see "heavy_callback" below).
+prefetcher = Prefetcher.from_environment(registry, os.environ)
+prefetcher.register_routes(server)
+if prefetcher.enabled and background_callback_manager is not None:
+    print("Note: BOE_PREFETCH and BOE_BACKGROUND_CALLBACKS are both set; the background callbacks are not prefetched.")
+
+def triggered_by_bundle_update(arguments):
+    # Calls triggered by a new bundle version skip the cache (the callback decides whether its figure has changed)
+    return arguments.get('bundle_update') is not None and ctx.triggered_id == 'bundle-version'
+
+# Define a decorator that registers a heavy callback: as a background job (with a progress bar) when enabled above,
+# otherwise as a regular callback. The decorated function itself is left unchanged, and can be called directly.
+progress_bar_style = {'width': '100%', 'margin-top': '10px'}
+
+def heavy_callback(output, inputs, progress_bar_id):
+    def register(function):
+        if background_callback_manager is None:
+            app.callback(output, inputs)(function)
+            return function
+        
+        # A background job runs in its own (forked) process, where the prefetcher's cache is never shared and its lock
+        # may have been copied mid-use - so the job runs the callback without the prefetcher's cache
+        uncached_function = getattr(function, 'uncached', function)
+        
+        # Dash passes the "set_progress" function first, when running a callback in the background
+        @functools.wraps(uncached_function)
+        def background_function(set_progress, *args):
+            return uncached_function(*args, set_progress=set_progress)
+        
+        app.callback(
+            output,
+            inputs,
+            background=True,
+            progress=[Output(progress_bar_id, 'value'), Output(progress_bar_id, 'max')],
+            running=[(Output(progress_bar_id, 'style'), progress_bar_style, {'display': 'none'})],
+            )(background_function)
+        return function
+    return register
+
+def report_progress(set_progress, done, total):
+    if set_progress is not None:
+        set_progress((str(done), str(total)))
+
 # -------------------------------------------------------------------------------
 # Define Dashboard Components (Dashboard Position: Row 1 of 5, Col 1 of 3)
 # -------------------------------------------------------------------------------
@@ -64,6 +227,17 @@ markdown_text = """
 This interactive tool provides a high-level overview of GDP growth rates, and the evolution over time of the major components of GDP and UK Household consumption.
 """
 
+# Define the dataset dropdown, for the user to choose which of the hosted datasets to display
+dataset_dropdown = dcc.Dropdown(
+    id='dataset-dropdown',
+    options=[{'label': registry.label(dataset_id), 'value': dataset_id} for dataset_id in registry.dataset_ids()],
+    value=registry.default_id,  # when dashboard first loads, this is the value automatically selected
+    clearable=False
+    )
+
+# The dataset dropdown is only displayed when the dashboard hosts more than one dataset
+dataset_selector_style = {} if len(registry.dataset_ids()) > 1 else {'display': 'none'}
+
 # Define the RadioItems buttons, for user to change % Quarter Comparison
 radio_display = dcc.RadioItems(
     id='radio-display',
@@ -82,17 +256,25 @@ radio_display = dcc.RadioItems(
 # Define callback to update the plot based on selected radio button value
 @app.callback(
     Output('Plot_GDP_Heatmap', 'figure'),
-    Input('radio-display', 'value')
+    [Input('radio-display', 'value'),
+     Input('dataset-dropdown', 'value'),
+     Input('bundle-version', 'data')]
     )
 
-def update_heatmap(selected_option):
+def update_heatmap(selected_option, dataset_id=None, bundle_update=None):
+    if unchanged_by_update(dataset_id, bundle_update, ['df_GDP_QvPriorQ', 'df_GDP_QvPriorY']):
+        return no_update
+    dataset = registry.get(dataset_id)
     
     # This code determines which dataframe to use based on the user-selected radio button value ('radio-display')
+    # (The heatmap shows the last 5 quarters of the GDP components, and of total GDP)
+    heatmap_columns = [column for column in dataset['GDP_Components'] + ['GDP_Total_MarketPrices']
+                       if column in dataset['df_GDP'].columns]
     if selected_option == 'prior_q':
-        sliced_df = df_GDP_QvPriorQ.iloc[-5:, :7]
+        sliced_df = dataset['df_GDP_QvPriorQ'].iloc[-5:][heatmap_columns]
         title = "% Change For Various GDP Components.<br>Current Quarter vs Prior Quarter"
     else:
-        sliced_df = df_GDP_QvPriorY.iloc[-5:, :7]
+        sliced_df = dataset['df_GDP_QvPriorY'].iloc[-5:][heatmap_columns]
         title = "% Change For Various GDP Components.<br>Current Quarter vs Same Quarter Last Year"
     
     # Transpose and format the DataFrame so that it is suitable for displaying as a tabular heatmap.
@@ -135,25 +317,54 @@ num_bins = 100
 # Create the numpy array (manually set the lower and upper limit, recalling that Z-score was capped earlier at +/-4)
 bars_array = np.arange(-4.1, 4.2, 0.1)
 
+# Define the RadioItems buttons, for the user to choose what each growth rate's Z-score is measured against:
+# the full sample (which changes every historical Z-score when a new quarter is added), or only the quarters
+# known at the time (every quarter so far, or the last 10 years) - see "as_of_zscores" in BOE_Utilities.
+radio_zscore_basis = dcc.RadioItems(
+    id='radio-zscore-basis',
+    options=[
+        {'label': 'Full Sample', 'value': 'full'},
+        {'label': 'As-Of (All Prior Quarters)', 'value': 'expanding'},
+        {'label': 'As-Of (Prior 10 Years)', 'value': 'rolling'}
+        ],
+    value='full', # when dashboard first loads, this is the value automatically selected
+    labelStyle={'display': 'block'}
+    )
+
+zscore_columns = {'full': ('Zscore', None),
+                  'expanding': ('Zscore_Expanding', 'Percentile_Expanding'),
+                  'rolling': ('Zscore_Rolling', 'Percentile_Rolling')}
+
 # Define the callback to update the histogram based on the radio_display selection
 @app.callback(
     Output('Plot_GDP_histogram', 'figure'),
-    [Input('radio-display', 'value')]
+    [Input('radio-display', 'value'),
+     Input('radio-zscore-basis', 'value'),
+     Input('dataset-dropdown', 'value'),
+     Input('bundle-version', 'data')]
     )
 
-def update_histogram(selected_radio):
+def update_histogram(selected_radio, zscore_basis='full', dataset_id=None, bundle_update=None):
+    if unchanged_by_update(dataset_id, bundle_update, ['df_GDP_QvPriorQ', 'df_GDP_QvPriorY']):
+        return no_update
+    dataset = registry.get(dataset_id)
     
     # This code determines which dataframe to use based on the user-selected radio button value ('radio-display')
     if selected_radio == 'prior_q':
-        df = df_GDP_QvPriorQ
+        df = dataset['df_GDP_QvPriorQ']
         title = "Histogram of GDP growth rates as Zscores.<br>The most recent growth rate is highlighted yellow.<br>Current Quarter versus Prior Quarter."
     elif selected_radio == 'prior_y':
-        df = df_GDP_QvPriorY
+        df = dataset['df_GDP_QvPriorY']
         title = "Histogram of GDP growth rates as Zscores.<br>The most recent growth rate is highlighted yellow.<br>Current Quarter versus Same Quarter Last Year."
 
+    # Select the Z-scores measured on the chosen basis (and, for the as-of bases, the most recent quarter's percentile)
+    zscore_column, percentile_column = zscore_columns[zscore_basis]
+    if percentile_column is not None and not np.isnan(df[percentile_column].iloc[-1]):
+        title += f"<br>Most recent growth rate: percentile {df[percentile_column].iloc[-1]:.0f}, versus the quarters known at the time."
+    
     # Create a histogram trace for the Z-score distribution
     hist_trace = go.Histogram(
-        x=df['Zscore'].dropna(),
+        x=df[zscore_column].dropna(),
         name='Zscore',
         opacity=1,
         xbins=dict(size=0.1),
@@ -163,7 +374,7 @@ def update_histogram(selected_radio):
 
     # Find the index position in the array corresponding to the most recent Z-score
     # The purpose of this code is to enable that particular bar in the histogram to be highlighted (yellow)
-    bar_to_highlight = df['Zscore'].iloc[-1]
+    bar_to_highlight = df[zscore_column].iloc[-1]
     bar_position = np.abs(bars_array - bar_to_highlight).argmin() - 1
     colors = ['yellow' if i == bar_position else 'steelblue' for i in range(num_bins)]
     hist_trace.marker.color = colors
@@ -192,27 +403,35 @@ Plot_GDP_histogram = dcc.Graph(id='Plot_GDP_histogram')
 # -------------------------------------------------------------------------------
 
 # Define some useful objects, to enable the user to set what timeframe for the plots to display data for.
-min_year_in_dataset = min(df_GDP_QvPriorQ.index.year)
-max_year_in_dataset = max(df_GDP_QvPriorQ.index.year)
-default_year = str(1990)
+def year_options(dataset):
+    years = dataset['df_GDP_QvPriorQ'].index.year
+    return [{'label': str(year), 'value': year} for year in range(min(years), max(years)+1)]
 
-# Define the start year dropdown, for the user to set what timeframe for the plots to display data for
-start_year_dropdown = dcc.Dropdown(
-    id='start-year-dropdown',
-    options=[{'label': str(year), 'value': year} for year in range(min_year_in_dataset, max_year_in_dataset+1)],
-    value=default_year, # when dashboard first loads, this is the value automatically selected
-    placeholder='Select starting year',
-    clearable=False
-    )
+default_year = str(1990)
 
-# Define the end year dropdown, for the user to set what timeframe for the plots to display data for
-end_year_dropdown = dcc.Dropdown(
-    id='end-year-dropdown',
-    options=[{'label': str(year), 'value': year} for year in range(min_year_in_dataset, max_year_in_dataset+1)],
-    value=max_year_in_dataset,  # when dashboard first loads, this is the value automatically selected
-    placeholder='Select ending year',
-    clearable=False
-    )
+# The year dropdowns are built for each page load (see "serve_layout" below), from the current version of the dataset
+def year_dropdowns(dataset):
+    years = year_options(dataset)
+    
+    # Define the start year dropdown, for the user to set what timeframe for the plots to display data for
+    start_year_dropdown = dcc.Dropdown(
+        id='start-year-dropdown',
+        options=years,
+        value=default_year, # when dashboard first loads, this is the value automatically selected
+        placeholder='Select starting year',
+        clearable=False
+        )
+    
+    # Define the end year dropdown, for the user to set what timeframe for the plots to display data for
+    end_year_dropdown = dcc.Dropdown(
+        id='end-year-dropdown',
+        options=years,
+        value=years[-1]['value'],  # when dashboard first loads, this is the value automatically selected
+        placeholder='Select ending year',
+        clearable=False
+        )
+    
+    return start_year_dropdown, end_year_dropdown
 
 # Define the RadioItems buttons, for the user to select what TYPE of plot to display
 radio_plot_type = dcc.RadioItems(
@@ -240,6 +459,26 @@ radio_outlier_handling = dcc.RadioItems(
 # Define Dashboard Components (Dashboard Position: Row 2 of 5, Col 2 of 2)
 # -------------------------------------------------------------------------------
 
+# Define the likely next states of the plots that depend on the selected years, for the prefetcher (see above):
+# analysts typically sweep the start year forwards one year at a time, or nudge either year by one.
+def neighbouring_years(arguments, dataset):
+    years = dataset['df_GDP_QvPriorQ'].index.year
+    start_year, end_year = int(arguments['start_year']), int(arguments['end_year'])
+    candidates = [(start_year + 1, end_year), (start_year - 1, end_year),
+                  (start_year, end_year - 1), (start_year, end_year + 1)]
+    return [{'start_year': start, 'end_year': end} for start, end in candidates
+            if min(years) <= start <= end <= max(years)]
+
+def time_plot_neighbours(arguments, dataset):
+    # ...and they flip between the two periodicities, and between the two plot types
+    other_periodicity = {'prior_q': 'prior_y', 'prior_y': 'prior_q'}
+    other_plot_type = {'bar': 'line', 'line': 'bar'}
+    year_changes = neighbouring_years(arguments, dataset)
+    return (year_changes[:1] +
+            [{'selected_option': other_periodicity[arguments['selected_option']]}] +
+            year_changes[1:] +
+            [{'plot_type': other_plot_type[arguments['plot_type']]}])
+
 # Define the callback to update the y-axis range and time range based on user selections
 @app.callback(
     Output('Plot_GDP_Time', 'figure'),
@@ -247,20 +486,27 @@ radio_outlier_handling = dcc.RadioItems(
      Input('radio-plot-type', 'value'),
      Input('radio-outlier-handling', 'value'),
      Input('start-year-dropdown', 'value'),
-     Input('end-year-dropdown', 'value')]
+     Input('end-year-dropdown', 'value'),
+     Input('dataset-dropdown', 'value'),
+     Input('bundle-version', 'data')]
     )
+@prefetcher.cached(time_plot_neighbours, bypass=triggered_by_bundle_update)
 
-def update_gdp_time_plot(selected_option, plot_type, outlier_handling, start_year, end_year):
+def update_gdp_time_plot(selected_option, plot_type, outlier_handling, start_year, end_year, dataset_id=None, bundle_update=None):
+    if unchanged_by_update(dataset_id, bundle_update, ['df_GDP_QvPriorQ', 'df_GDP_QvPriorY']):
+        return no_update
+    dataset = registry.get(dataset_id)
+    
     # Convert start year and end year to strings
     start_year_str = str(start_year)
     end_year_str = str(end_year)
     
     # This code determines which dataframe to use based on the user-selected radio button value ('radio-display')
     if selected_option == 'prior_q':
-        df = df_GDP_QvPriorQ.loc[start_year_str:end_year_str]
+        df = dataset['df_GDP_QvPriorQ'].loc[start_year_str:end_year_str]
         title = 'GDP % Change.<br>Current Quarter vs Prior Quarter'
     elif selected_option == 'prior_y':
-        df = df_GDP_QvPriorY.loc[start_year_str:end_year_str]
+        df = dataset['df_GDP_QvPriorY'].loc[start_year_str:end_year_str]
         title = 'GDP % Change.<br>Current Quarter vs Same Quarter Last Year'
     
     y_data = df['GDP_Total_MarketPrices']
@@ -322,20 +568,30 @@ This plot provides an indication for the relative importance of each component a
 # -------------------------------------------------------------------------------
 
 # Define the callback to update the stacked bar chart based on start and end year selections
-@app.callback(
+@heavy_callback(
     Output('Plot_GDP_Stacks', 'figure'),
     [Input('start-year-dropdown', 'value'),
      Input('end-year-dropdown', 'value'),
-     Input('color-scheme-dropdown', 'value')]
+     Input('color-scheme-dropdown', 'value'),
+     Input('dataset-dropdown', 'value'),
+     Input('bundle-version', 'data')],
+    progress_bar_id='stacks-progress'
     )
+@prefetcher.cached(neighbouring_years, bypass=triggered_by_bundle_update)
 
-def update_stacked_bar_chart(start_year, end_year, color_scheme):
+def update_stacked_bar_chart(start_year, end_year, color_scheme, dataset_id=None, bundle_update=None, set_progress=None):
+    if unchanged_by_update(dataset_id, bundle_update, ['df_GDPComponents_Abs', 'GDP_Components', 'rollups']):
+        return no_update
+    dataset = registry.get(dataset_id)
+    
     # Convert start year and end year to strings
     start_year_str = str(start_year)
     end_year_str = str(end_year)
     
-    # Slice the DataFrame based on the selected start and end years
-    sliced_df = df_GDPComponents_Abs.loc[start_year_str:end_year_str, GDP_Components]
+    # Slice the DataFrame based on the selected start and end years.
+    # For wide ranges of years, the slice is taken from a pre-aggregated (annual or multi-year) rollup.
+    sliced_df, resolution_label = slice_years(dataset, 'df_GDPComponents_Abs', start_year_str, end_year_str,
+                                              dataset['GDP_Components'])
 
     # Define color schemes
     color_schemes = {
@@ -352,13 +608,14 @@ def update_stacked_bar_chart(start_year, end_year, color_scheme):
             x=sliced_df.index,
             y=sliced_df[column],
             name=column,
-            marker=dict(color=trace_colors[i], line=dict(width=0.25, color='black')),
+            marker=dict(color=trace_colors[i % len(trace_colors)], line=dict(width=0.25, color='black')),
             )
         bar_traces.append(bar_trace)
+        report_progress(set_progress, i + 1, len(sliced_df.columns))
 
     # Configure the stacked bar chart layout
     bar_layout = go.Layout(
-        title='Charting The Changing Significance Of GDP Components, To Total GDP',
+        title=f'Charting The Changing Significance Of GDP Components, To Total GDP ({resolution_label})',
         title_x=0.5,
         yaxis={'title': 'Percentage', 'range': [0, 100]},
         barmode='stack',
@@ -378,19 +635,56 @@ def update_stacked_bar_chart(start_year, end_year, color_scheme):
 # Create the Dash plot object
 Plot_GDP_Stacks = dcc.Graph(id='Plot_GDP_Stacks')
 
+# A progress bar, displayed while the stacked bar chart renders in the background (see "heavy_callback" above)
+stacks_progress = html.Progress(id='stacks-progress', value='0', max='1', style={'display': 'none'})
+
 # -------------------------------------------------------------------------------
 # Define Dashboard Components (Dashboard Position: Row 4 of 5, Col 1 of 2)
 # -------------------------------------------------------------------------------
 
 # Give user ability to select a specific GDP component for visualisation in the bar chart
-dropdown_options = [{'label': col, 'value': col} for col in df_GDP_QvPriorQ[GDP_Components].columns]
-
-Buttons_Components = dcc.Dropdown(
+def component_options(dataset):
+    return [{'label': col, 'value': col} for col in dataset['df_GDP_QvPriorQ'][dataset['GDP_Components']].columns]
+
+# The dropdown only holds the options matching what the user has typed (one page of them), fetched from the server
+def component_series(dataset):
+    return [option['value'] for option in component_options(dataset)]
+
+def component_search_options(dataset, search_value, selected_column):
+    index = series_index(dataset, 'GDP_Components', component_series)
+    options, _ = index.search(search_value, page_size=dropdown_page_size)
+    # The selected component is always included (otherwise the dropdown would display it as blank)
+    matched = {option['value'] for option in options}
+    selected = [option for option in index.options_for([selected_column]) if option['value'] not in matched]
+    return selected + options
+
+# By default, the second-to-last GDP component is selected (the trade balance, with the default column_mapping)
+def default_component_of(dataset):
+    components = dataset['GDP_Components']
+    return components[-2] if len(components) > 1 else components[0]
+
+def component_dropdown(dataset):
+    default_component = default_component_of(dataset)
+    return dcc.Dropdown(
         id='Buttons_Components',
-        options=dropdown_options,
-        value=df_GDP_QvPriorQ[GDP_Components].columns[-2], # when dashboard first loads, this is the value automatically selected
+        options=component_search_options(dataset, None, default_component),
+        value=default_component, # when dashboard first loads, this is the value automatically selected
+        placeholder='Type to search components',
         clearable=False)
 
+# Define the callback that fetches the matching options, as the user types into the dropdown
+@app.callback(
+    Output('Buttons_Components', 'options'),
+    [Input('Buttons_Components', 'search_value'),
+     Input('Buttons_Components', 'value'),
+     Input('dataset-dropdown', 'value')],
+    prevent_initial_call=True
+    )
+
+def update_component_options(search_value, selected_column, dataset_id=None):
+    dataset = registry.get(dataset_id)
+    return component_search_options(dataset, search_value, selected_column)
+
 markdown_text3="""
 *Note: This chart does **not** display the percentage changes for GDP components. 
 Some of these components are volatile and produce extreme percentage changes, meaning the **level** provides a more intuitive guide to the evolution of GDP.*
@@ -404,14 +698,22 @@ Some of these components are volatile and produce extreme percentage changes, me
     Output('Plot_GDP_Components', 'figure'),
     [Input('Buttons_Components', 'value'),
      Input('start-year-dropdown', 'value'),
-     Input('end-year-dropdown', 'value')]
+     Input('end-year-dropdown', 'value'),
+     Input('dataset-dropdown', 'value'),
+     Input('bundle-version', 'data')]
     )
+@prefetcher.cached(neighbouring_years, bypass=triggered_by_bundle_update)
 
-def update_bar_chart(selected_column, start_year, end_year):
+def update_bar_chart(selected_column, start_year, end_year, dataset_id=None, bundle_update=None):
+    if unchanged_by_update(dataset_id, bundle_update, ['df_GDP', 'rollups']):
+        return no_update
+    dataset = registry.get(dataset_id)
+    
     # Slice the DataFrame based on the selected time range
     start_year_str = str(start_year)
     end_year_str = str(end_year)
-    df = df_GDP.loc[start_year_str:end_year_str]
+    # For wide ranges of years, the slice is taken from a pre-aggregated (annual or multi-year) rollup.
+    df, resolution_label = slice_years(dataset, 'df_GDP', start_year_str, end_year_str)
     
     y_data = df[selected_column]
     
@@ -423,9 +725,15 @@ def update_bar_chart(selected_column, start_year, end_year):
         marker=dict(line=dict(width=0.25, color='black'))
         )
     
+    # Rolled-up levels are averages of the quarterly levels, so they remain in the same units
+    if resolution_label == 'Quarterly':
+        yaxis_title = 'Level (£m)'
+    else:
+        yaxis_title = f'Level (£m, {resolution_label.lower()} average per quarter)'
+    
     layout = go.Layout(
-        title=f'Bar Chart Showing The Changing Level Of {selected_column}',
-        yaxis={'title': 'Level (£m)'}
+        title=f'Bar Chart Showing The Changing Level Of {selected_column} ({resolution_label})',
+        yaxis={'title': yaxis_title}
         )
     
     return {'data': [trace], 'layout': layout}
@@ -440,36 +748,114 @@ Plot_GDP_Components = dcc.Graph(id='Plot_GDP_Components')
 # Sort the columns ascending, highest value first.
 # We do this to resolve a strange problem whereby the color of the lines changes, when the user changes which lines to display.
 # We want the colors to be fixed, stable, consistent.
-sorted_columns = df_GDP[Household_Components].iloc[-1].sort_values(ascending=False).index
+def household_options(dataset):
+    df_GDP = dataset['df_GDP']
+    sorted_columns = df_GDP[dataset['Household_Components']].iloc[-1].sort_values(ascending=False).index
+    return [{'label': component, 'value': component} for component in sorted_columns]
+
+def household_series(dataset):
+    return [option['value'] for option in household_options(dataset)]
+
+# By default, only the largest few components are ticked (so the line plot does not grow with the number of series)
+default_household_count = 5
+
+def default_household_selection(dataset):
+    return household_series(dataset)[:default_household_count]
+
+# The checklist only displays one page of the components matching the search box.
+# (Ticked components stay selected while they are off the page, or filtered out by the search.)
+def household_page(dataset, search_value, page):
+    index = series_index(dataset, 'Household_Components', household_series)
+    options, total = index.search(search_value, page=page, page_size=checklist_page_size)
+    last_page = max(0, (total - 1) // checklist_page_size)
+    page = min(max(0, page), last_page)
+    label = f'Page {page + 1} of {last_page + 1}' if total else 'No matching components'
+    # The page controls are only displayed when they are needed
+    pager_style = {'margin-top': '5px'} if last_page > 0 or total == 0 else {'display': 'none'}
+    return options, page, label, pager_style
+
+# Define the search box for the checklist
+household_search = dcc.Input(
+    id='household-search',
+    type='search',
+    placeholder='Search components',
+    debounce=True,  # search when the user presses enter (or leaves the box), rather than on every keystroke
+    style={'width': '100%', 'margin-bottom': '5px'}
+    )
 
-# Define the checklist options
-checklist_options = [{'label': component, 'value': component} for component in sorted_columns]
+# Define the checklist component, and the controls to move between its pages (built for each page load)
+def household_checklist(dataset):
+    checklist_options, _, checklist_page_label, checklist_pager_style = household_page(dataset, None, 0)
+    
+    checklist = dcc.Checklist(
+        id='component-checkboxes',
+        options=checklist_options,
+        value=default_household_selection(dataset),  # By default, select to display the largest components
+        labelStyle={'display': 'block'}
+        )
+    
+    household_pager = html.Div(
+        [html.Button('<', id='household-page-previous', n_clicks=0),
+         html.Span(checklist_page_label, id='household-page-label', style={'margin': '0 10px'}),
+         html.Button('>', id='household-page-next', n_clicks=0),
+         dcc.Store(id='household-page', data=0)],
+        id='household-pager',
+        style=checklist_pager_style
+        )
+    
+    return checklist, household_pager
 
-# Define the checklist component
-checklist = dcc.Checklist(
-    id='component-checkboxes',
-    options=checklist_options,
-    value=df_GDP[Household_Components].columns.tolist(),  # By default, select to display ALL components
-    labelStyle={'display': 'block'}
+# Define the callback that fetches a page of the matching components (when the user searches, or changes page)
+@app.callback(
+    [Output('component-checkboxes', 'options'),
+     Output('household-page', 'data'),
+     Output('household-page-label', 'children'),
+     Output('household-pager', 'style')],
+    [Input('household-search', 'value'),
+     Input('household-page-previous', 'n_clicks'),
+     Input('household-page-next', 'n_clicks'),
+     Input('dataset-dropdown', 'value')],
+    [State('household-page', 'data')],
+    prevent_initial_call=True
     )
 
+def update_household_options(search_value, previous_clicks, next_clicks, dataset_id=None, page=0):
+    dataset = registry.get(dataset_id)
+    if ctx.triggered_id == 'household-page-next':
+        page = page + 1
+    elif ctx.triggered_id == 'household-page-previous':
+        page = page - 1
+    else:
+        page = 0  # a new search (or another dataset) starts again from the first page
+    return household_page(dataset, search_value, page)
+
 # -------------------------------------------------------------------------------
 # Define Dashboard Components (Dashboard Position: Row 5 of 5, Col 2 of 3)
 # -------------------------------------------------------------------------------
 
 # Callback to update the line plot based on the selected components
-@app.callback(
+@heavy_callback(
     Output('Plot_Household_Time', 'figure'),
-    [Input('component-checkboxes', 'value')]
+    [Input('component-checkboxes', 'value'),
+     Input('dataset-dropdown', 'value'),
+     Input('bundle-version', 'data')],
+    progress_bar_id='households-progress'
     )
 
-def update_line_plot(selected_components):
+def update_line_plot(selected_components, dataset_id=None, bundle_update=None, set_progress=None):
+    if unchanged_by_update(dataset_id, bundle_update, ['df_GDP', 'Household_Components']):
+        return no_update
+    dataset = registry.get(dataset_id)
+    df_GDP = dataset['df_GDP']
+    Household_Components = dataset['Household_Components']
+    
     traces = []
     colors = ['blue', 'red', 'green', 'orange', 'purple']  # Define fixed colors for the lines
     
+    # Each component keeps the color of its position in Household_Components, whichever components are selected
+    color_positions = {component: position for position, component in enumerate(Household_Components)}
     for component in selected_components:
-        color_index = df_GDP[Household_Components].columns.get_loc(component)
-        color = colors[color_index % len(colors)]
+        color = colors[color_positions[component] % len(colors)]
         
         traces.append(go.Scatter(
             x=df_GDP.index[120:],  # Apply the slicing here
@@ -478,6 +864,7 @@ def update_line_plot(selected_components):
             name=component,
             line=dict(color=color)
             ))
+        report_progress(set_progress, len(traces), len(selected_components))
 
     # Define the slider steps
     slider_steps = [
@@ -507,6 +894,9 @@ def update_line_plot(selected_components):
 # Create the Dash plot object
 Plot_Household_Time = dcc.Graph(id='Plot_Household_Time')
 
+# A progress bar, displayed while the line plot renders in the background (see "heavy_callback" above)
+households_progress = html.Progress(id='households-progress', value='0', max='1', style={'display': 'none'})
+
 # -------------------------------------------------------------------------------
 # Define Dashboard Components (Dashboard Position: Row 5 of 5, Col 3 of 3)
 # -------------------------------------------------------------------------------
@@ -517,160 +907,417 @@ color_scheme = ["green", "blue", "purple", "orange", "red",
                 "steelblue", "steelblue", "steelblue", "steelblue", "steelblue",
                 "black"]
 
-# Create the treemap
-fig_treemap = px.treemap(
-    data_frame=df_treemap,
-    path=["Parent_Component", "Component"],
-    values="Value",
-    color="Component",
-    color_discrete_sequence=color_scheme,
-    custom_data=[df_treemap["Component"]],  # Add the Component column as custom data
+# Define a function that creates the treemap for a dataset (it is created once per dataset, then re-used)
+treemap_title = 'Treemap Showing The Relative Sizes Of GDP Components.<br>(Using The {} Values)'
+
+def create_treemap_figure(dataset):
+    if 'fig_treemap' not in dataset.cache:
+        df_treemap = dataset['df_treemap']
+        
+        # Create the treemap
+        fig_treemap = px.treemap(
+            data_frame=df_treemap,
+            path=["Parent_Component", "Component"],
+            values="Value",
+            color="Component",
+            color_discrete_sequence=color_scheme,
+            custom_data=[df_treemap["Component"]],  # Add the Component column as custom data
+            )
+        
+        # Set the title and center it
+        fig_treemap.update_layout(
+            title=treemap_title.format('Most Recent Quarter'),
+            margin={'l': 45, 'r': 45, 't': 75, 'b': 45},
+            title_x=0.5,
+            title_y=0.95,
+            )
+        
+        # Add borders to the treemap blocks
+        for trace in fig_treemap.data:
+            trace.marker.line.color = 'black'
+            trace.marker.line.width = 0.5
+        
+        # Find the position of each of the figure's treemap nodes within the precomputed array of values
+        treemap_node_ids = dataset['treemap_hierarchy']['ids']
+        treemap_node_positions = [treemap_node_ids.index(node_id) for node_id in fig_treemap.data[0].ids]
+        
+        dataset.cache['fig_treemap'] = (fig_treemap, treemap_node_positions)
+    
+    return dataset.cache['fig_treemap']
+
+# Create the Dash plot object (for each page load, from the current version of the dataset)
+def treemap_graph(dataset):
+    fig_treemap, _ = create_treemap_figure(dataset)
+    return dcc.Graph(id='Plot_Treemap', figure=fig_treemap, style={'height': '390px'})
+
+# Define a quarter slider, so the user can scrub the treemap back through time.
+# Every quarter's values were precomputed in "BOE_Data.py" (treemap_hierarchy), so moving the slider only swaps
+# the values of the existing treemap (via a Patch) - the figure is never rebuilt through px.treemap.
+def treemap_slider_marks(dataset):
+    treemap_periods = dataset['treemap_hierarchy']['periods']
+    return {i: str(period.year) for i, period in enumerate(treemap_periods) if period.month == 1 and period.year % 5 == 0}
+
+def treemap_slider(dataset):
+    last_quarter_position = len(dataset['treemap_hierarchy']['periods']) - 1
+    return dcc.Slider(
+        id='treemap-quarter-slider',
+        min=0,
+        max=last_quarter_position,
+        step=1,
+        value=last_quarter_position,  # when dashboard first loads, the most recent quarter is selected
+        marks=treemap_slider_marks(dataset),
+        updatemode='drag'
+        )
+
+# Define the callback to swap the treemap values when the user moves the quarter slider
+# (or to switch to another dataset's treemap, when the user selects another dataset)
+@app.callback(
+    Output('Plot_Treemap', 'figure'),
+    [Input('treemap-quarter-slider', 'value'),
+     Input('dataset-dropdown', 'value'),
+     Input('bundle-version', 'data')],
+    prevent_initial_call=True
+    )
+
+def update_treemap(quarter_position, dataset_id=None, bundle_update=None):
+    if unchanged_by_update(dataset_id, bundle_update, ['df_treemap', 'treemap_hierarchy']):
+        return no_update
+    dataset = registry.get(dataset_id)
+    treemap_hierarchy = dataset['treemap_hierarchy']
+    fig_treemap, treemap_node_positions = create_treemap_figure(dataset)
+    
+    last_quarter_position = len(treemap_hierarchy['periods']) - 1
+    quarter_position = min(quarter_position, last_quarter_position)
+    quarter = treemap_hierarchy['periods'][quarter_position]
+    
+    # A different dataset (or a new version of this one) needs its own treemap figure (its nodes may differ);
+    # otherwise, only the values are swapped.
+    # (The slider may be moved by the same change - see "update_dataset_selectors" - so every trigger is checked.)
+    if {'dataset-dropdown.value', 'bundle-version.data'} & set(ctx.triggered_prop_ids):
+        if quarter_position == last_quarter_position:
+            return fig_treemap
+        fig_quarter = go.Figure(fig_treemap)
+        fig_quarter.data[0].values = treemap_hierarchy['values'][quarter_position, treemap_node_positions]
+        fig_quarter.layout.title.text = treemap_title.format(f'{quarter.year} Q{quarter.quarter}')
+        return fig_quarter
+    
+    patched_figure = Patch()
+    patched_figure['data'][0]['values'] = treemap_hierarchy['values'][quarter_position, treemap_node_positions].tolist()
+    patched_figure['layout']['title']['text'] = treemap_title.format(f'{quarter.year} Q{quarter.quarter}')
+    
+    return patched_figure
+
+# -------------------------------------------------------------------------------
+# Define Dashboard Components (Dashboard Position: Row 6, optional) - comparing two vintages of the data
+# -------------------------------------------------------------------------------
+
+"""
+When the BOE_VINTAGE_STORE environment variable gives the directory of a vintage store (see "BOE_Vintages.py"),
+an extra row lets the user compare two vintages (data releases) of df_GDP: the revisions made to a series between
+the old and the new vintage, period by period. Only the deltas between the two vintages are read from the store,
+so no full copy of df_GDP is held in memory for each vintage.
+The vintages listed are those in the store when the dashboard starts.
+"""
+vintage_store = VintageStore(os.environ['BOE_VINTAGE_STORE']) if os.environ.get('BOE_VINTAGE_STORE') else None
+vintage_options = [{'label': f'{vintage:%Y-%m-%d}', 'value': f'{vintage:%Y-%m-%d}'}
+                   for vintage in (vintage_store.vintages() if vintage_store is not None else [])]
+
+# Define the dropdowns, for the user to choose the two vintages (by default, the two most recent) and the series
+old_vintage_dropdown = dcc.Dropdown(
+    id='old-vintage-dropdown',
+    options=vintage_options,
+    value=vintage_options[-2]['value'] if len(vintage_options) > 1 else None,
+    placeholder='Select old vintage',
+    clearable=False
     )
 
-# Set the title and center it
-fig_treemap.update_layout(
-    title='Treemap Showing The Relative Sizes Of GDP Components.<br>(Using The Most Recent Quarter Values)',
-    margin={'l': 45, 'r': 45, 't': 75, 'b': 45},
-    title_x=0.5,
-    title_y=0.95,
+new_vintage_dropdown = dcc.Dropdown(
+    id='new-vintage-dropdown',
+    options=vintage_options,
+    value=vintage_options[-1]['value'] if vintage_options else None,
+    placeholder='Select new vintage',
+    clearable=False
     )
 
-# Add borders to the treemap blocks
-for trace in fig_treemap.data:
-    trace.marker.line.color = 'black'
-    trace.marker.line.width = 0.5
+vintage_series_dropdown = dcc.Dropdown(
+    id='vintage-series-dropdown',
+    options=[{'label': col, 'value': col} for col in df_GDP.columns],
+    value='GDP_Total_MarketPrices',  # when dashboard first loads, this is the value automatically selected
+    clearable=False
+    )
+
+# Define the callback that plots the revisions to the selected series, between the two selected vintages
+@app.callback(
+    Output('Plot_Vintage_Revisions', 'figure'),
+    [Input('old-vintage-dropdown', 'value'),
+     Input('new-vintage-dropdown', 'value'),
+     Input('vintage-series-dropdown', 'value')]
+    )
+
+def update_vintage_revisions(old_vintage, new_vintage, series):
+    layout = go.Layout(title_x=0.5, yaxis={'title': 'Revision (£m)'}, bargap=0.2)
+    if old_vintage is None or new_vintage is None:
+        layout.title = 'Select two vintages to compare (the vintage store needs at least two vintages)'
+        return {'data': [], 'layout': layout}
+    
+    try:
+        revisions = vintage_store.compare(old_vintage, new_vintage, series)
+    except ValueError as e:
+        print(f"Error: {e}")
+        layout.title = 'Select an old vintage that is earlier than the new vintage'
+        return {'data': [], 'layout': layout}
+    
+    revisions = revisions.reset_index()
+    # Values published for the first time (i.e. new quarters) are not revisions, so they are not plotted
+    revisions = revisions.dropna(subset=['Revision'])
+    
+    trace = go.Bar(
+        x=revisions['TimePeriod'],
+        y=revisions['Revision'],
+        name=series,
+        marker=dict(line=dict(width=0.25, color='black'))
+        )
+    layout.title = f'Revisions To {series}.<br>Vintage {old_vintage} vs Vintage {new_vintage} ({len(revisions)} periods revised)'
+    
+    return {'data': [trace], 'layout': layout}
 
 # Create the Dash plot object
-Plot_Treemap = dcc.Graph(id='Plot_Treemap', figure=fig_treemap)
+Plot_Vintage_Revisions = dcc.Graph(id='Plot_Vintage_Revisions')
+
+# -------------------------------------------------------------------------------
+# Define the callback that updates the dashboard's selectors, when the user selects another dataset
+# (or when a new version of the dataset is pushed by the server, see "BOE_Live.py")
+# -------------------------------------------------------------------------------
+
+@app.callback(
+    [Output('start-year-dropdown', 'options'),
+     Output('end-year-dropdown', 'options'),
+     Output('start-year-dropdown', 'value'),
+     Output('end-year-dropdown', 'value'),
+     Output('Buttons_Components', 'value'),
+     Output('component-checkboxes', 'value'),
+     Output('treemap-quarter-slider', 'max'),
+     Output('treemap-quarter-slider', 'marks'),
+     Output('treemap-quarter-slider', 'value')],
+    [Input('dataset-dropdown', 'value'),
+     Input('bundle-version', 'data')],
+    [State('start-year-dropdown', 'value'),
+     State('end-year-dropdown', 'value'),
+     State('end-year-dropdown', 'options'),
+     State('Buttons_Components', 'value'),
+     State('component-checkboxes', 'value'),
+     State('treemap-quarter-slider', 'value'),
+     State('treemap-quarter-slider', 'max')],
+    prevent_initial_call=True
+    )
+
+def update_dataset_selectors(dataset_id, bundle_update=None, start_year=None, end_year=None, end_year_options=None,
+                             selected_column=None, selected_components=None, quarter_position=None, last_quarter=None):
+    if unchanged_by_update(dataset_id, bundle_update, ['df_GDP_QvPriorQ', 'GDP_Components', 'Household_Components',
+                                                       'treemap_hierarchy']):
+        return (no_update,) * 9
+    dataset = registry.get(dataset_id)
+    
+    years = year_options(dataset)
+    last_quarter_position = len(dataset['treemap_hierarchy']['periods']) - 1
+    
+    # The start year is kept if the new dataset covers it; otherwise it is clamped into the new dataset's years
+    first_year, last_year = years[0]['value'], years[-1]['value']
+    start_year = min(max(int(start_year or first_year), first_year), last_year)
+    
+    if ctx.triggered_id != 'bundle-version':
+        # (The options of the component selectors are fetched by their own search callbacks, above)
+        return (years, years, start_year, last_year,
+                default_component_of(dataset),
+                default_household_selection(dataset),
+                last_quarter_position, treemap_slider_marks(dataset), last_quarter_position)
+    
+    # A new version of the same dataset keeps the user's selections, where they still exist.
+    # An end year (or a treemap quarter) at the latest one moves on to the new latest one.
+    previous_last_year = end_year_options[-1]['value'] if end_year_options else None
+    end_year = last_year if end_year is None or int(end_year) == previous_last_year else int(end_year)
+    end_year = min(max(end_year, start_year), last_year)
+    if selected_column not in dataset['GDP_Components']:
+        selected_column = default_component_of(dataset)
+    selected_components = [component for component in selected_components or []
+                           if component in dataset['Household_Components']]
+    if quarter_position is None or quarter_position == last_quarter:
+        quarter_position = last_quarter_position
+    quarter_position = min(quarter_position, last_quarter_position)
+    return (years, years, start_year, end_year,
+            selected_column,
+            selected_components,
+            last_quarter_position, treemap_slider_marks(dataset), quarter_position)
 
 # -------------------------------------------------------------------------------
 # Arrange the dashboard
 # -------------------------------------------------------------------------------
 
-# Define the app layout
-app.layout = html.Div(children=[
-    
-    # Row 1
-    html.Div(children=[
-        # Column 1
-        html.Div(
-            [dcc.Markdown(markdown_text), 
-             html.Div(html.Strong("Select Periodicity:")), 
-             radio_display,],
-            style={'width': '20%', 'height': '455px', 'border-right': '3px solid black', 
-                   'border-bottom': '0.5px solid silver', "padding":"20px", 
-                   'background-color': 'lavender'}
-                    ),
-        # Column 2
-        html.Div(
-            Plot_GDP_Heatmap, 
-            style={'width': '40%', 'height': '455px', 'border-right': '0.5px solid silver',
-                   'border-bottom': '0.5px solid silver'}
-                    ),
-        # Column 3
-        html.Div(
-            Plot_GDP_histogram,
-            style={'width': '40%', 'height': '455px', 'border-bottom': '0.5px solid silver'}
-            ),
+# The layout is built for each page load, from the current version of the default dataset: after the bundle has
+# been updated (see "BOE_Live.py"), a refreshed page offers its new years and quarters
+def serve_layout():
+    dataset = registry.get()
+    start_year_dropdown, end_year_dropdown = year_dropdowns(dataset)
+    Buttons_Components = component_dropdown(dataset)
+    checklist, household_pager = household_checklist(dataset)
+    
+    return html.Div(children=[
+    
+        # The latest bundle versions pushed by the server (see "assets/BOE_live_updates.js")
+        dcc.Store(id='bundle-version'),
+    
+        # Row 1
+        html.Div(children=[
+            # Column 1
+            html.Div(
+                [dcc.Markdown(markdown_text), 
+                 html.Div([html.Strong("Select Dataset:"), dataset_dropdown], style=dataset_selector_style),
+                 html.Div(html.Strong("Select Periodicity:")), 
+                 radio_display,
+                 html.Div(html.Strong("Measure Z-scores Against:"), style={'margin-top': '10px'}), 
+                 radio_zscore_basis],
+                style={'width': '20%', 'height': '455px', 'border-right': '3px solid black', 
+                       'border-bottom': '0.5px solid silver', "padding":"20px", 
+                       'background-color': 'lavender'}
+                        ),
+            # Column 2
+            html.Div(
+                Plot_GDP_Heatmap, 
+                style={'width': '40%', 'height': '455px', 'border-right': '0.5px solid silver',
+                       'border-bottom': '0.5px solid silver'}
+                        ),
+            # Column 3
+            html.Div(
+                Plot_GDP_histogram,
+                style={'width': '40%', 'height': '455px', 'border-bottom': '0.5px solid silver'}
+                ),
+                ], 
+                 style={'display': 'flex', 'height': '455px'}),
+    
+    #-----------------------------------------------------------------------------------
+    
+        # Row 2
+        html.Div(children=[
+
+            # Column 1
+            html.Div(
+                [html.Div(html.Strong("Period Of Investigation:")), 
+                 start_year_dropdown, end_year_dropdown,
+                 html.Div(html.Strong("Select Plot Type:"), style={'margin-top': '10px'}), 
+                 radio_plot_type,
+                 html.Div(html.Strong("Combat Outliers?"), style={'margin-top': '10px'}), 
+                 radio_outlier_handling],
+                style={'width': '20%', 'height': '455px', 'border-right': '3px solid black', 
+                       'border-bottom': '0.5px solid silver', "padding":"20px", 
+                       'background-color': 'lavender'}
+                        ),
+    
+            # Column 2
+            html.Div(Plot_GDP_Time, style={'width': '80%', 'height': '455px', 'border-bottom': '0.5px solid silver'}),
             ], 
-             style={'display': 'flex', 'height': '455px'}),
-    
-#-----------------------------------------------------------------------------------
-    
-    # Row 2
-    html.Div(children=[
-
-        # Column 1
-        html.Div(
-            [html.Div(html.Strong("Period Of Investigation:")), 
-             start_year_dropdown, end_year_dropdown,
-             html.Div(html.Strong("Select Plot Type:"), style={'margin-top': '10px'}), 
-             radio_plot_type,
-             html.Div(html.Strong("Combat Outliers?"), style={'margin-top': '10px'}), 
-             radio_outlier_handling],
-            style={'width': '20%', 'height': '455px', 'border-right': '3px solid black', 
-                   'border-bottom': '0.5px solid silver', "padding":"20px", 
-                   'background-color': 'lavender'}
-                    ),
-    
-        # Column 2
-        html.Div(Plot_GDP_Time, style={'width': '80%', 'height': '455px', 'border-bottom': '0.5px solid silver'}),
-        ], 
-        style={'display': 'flex', 'height': '455px'}),
-    
-#-----------------------------------------------------------------------------------
-    
-    # Row 3
-    html.Div(children=[
-        
-        # Column 1
-        html.Div(
-            [html.Div(html.Strong("Color Scheme:")), 
-             color_scheme_dropdown,
-            dcc.Markdown(markdown_text2, style={'margin-top': '10px'})],
-            style={'width': '20%', 'height': '455px', 'border-right': '3px solid black', 
-                   'border-bottom': '0.5px solid silver', "padding":"20px", 
-                   'background-color': 'lavender'}
-                    ),
-
-        # Column 2
-        html.Div(Plot_GDP_Stacks, style={'width': '80%', 'height': '455px', 'border-bottom': '0.5px solid silver'}),
-        ], 
-        style={'display': 'flex', 'height': '455px'}),
-    
-#-----------------------------------------------------------------------------------
-    
-    # Row 4
-    html.Div(children=[
-
-        # Column 1
-        html.Div(
-            [html.Div(html.Strong("Select GDP Component:")), 
-             Buttons_Components,
-            dcc.Markdown(markdown_text3, style={'margin-top': '10px'})],
-            style={'width': '20%', 'height': '455px', 'border-right': '3px solid black', 
-                   'border-bottom': '0.5px solid silver', "padding":"20px", 
-                   'background-color': 'lavender'}
-                    ),
+            style={'display': 'flex', 'height': '455px'}),
+    
+    #-----------------------------------------------------------------------------------
+    
+        # Row 3
+        html.Div(children=[
         
-        # Column 2
-        html.Div(Plot_GDP_Components, 
-                 style={'width': '80%', 'height': '455px', 
-                        'border-bottom': '0.5px solid silver'}
+            # Column 1
+            html.Div(
+                [html.Div(html.Strong("Color Scheme:")), 
+                 color_scheme_dropdown,
+                dcc.Markdown(markdown_text2, style={'margin-top': '10px'}),
+                 stacks_progress],
+                style={'width': '20%', 'height': '455px', 'border-right': '3px solid black', 
+                       'border-bottom': '0.5px solid silver', "padding":"20px", 
+                       'background-color': 'lavender'}
                         ),
-                        ], 
-             style={'display': 'flex', 'height': '455px'}),
 
-#-----------------------------------------------------------------------------------
+            # Column 2
+            html.Div(Plot_GDP_Stacks, style={'width': '80%', 'height': '455px', 'border-bottom': '0.5px solid silver'}),
+            ], 
+            style={'display': 'flex', 'height': '455px'}),
     
-    # Row 5
-    html.Div(children=[
+    #-----------------------------------------------------------------------------------
+    
+        # Row 4
+        html.Div(children=[
+
+            # Column 1
+            html.Div(
+                [html.Div(html.Strong("Select GDP Component:")), 
+                 Buttons_Components,
+                dcc.Markdown(markdown_text3, style={'margin-top': '10px'})],
+                style={'width': '20%', 'height': '455px', 'border-right': '3px solid black', 
+                       'border-bottom': '0.5px solid silver', "padding":"20px", 
+                       'background-color': 'lavender'}
+                        ),
         
-        # Column 1
-        html.Div(
-            [html.Div(html.Strong("Select Household Components:")), 
-             checklist,],
-            style={'width': '20%', 'height': '455px', 'border-right': '3px solid black', 
-                   'border-bottom': '0.5px solid silver', "padding":"20px", 
-                   'background-color': 'lavender'}
-                    ),
+            # Column 2
+            html.Div(Plot_GDP_Components, 
+                     style={'width': '80%', 'height': '455px', 
+                            'border-bottom': '0.5px solid silver'}
+                            ),
+                            ], 
+                 style={'display': 'flex', 'height': '455px'}),
+
+    #-----------------------------------------------------------------------------------
+    
+        # Row 5
+        html.Div(children=[
         
-        # Column 2
-        html.Div(
-            Plot_Household_Time, 
-            style={'width': '40%', 'height': '455px', 'border-right': '0.5px solid silver', 
-                   'border-bottom': '0.5px solid silver'}
-                    ),
+            # Column 1
+            html.Div(
+                [html.Div(html.Strong("Select Household Components:")), 
+                 household_search,
+                 checklist,
+                 household_pager,
+                 households_progress],
+                style={'width': '20%', 'height': '455px', 'border-right': '3px solid black', 
+                       'border-bottom': '0.5px solid silver', "padding":"20px", 
+                       'background-color': 'lavender'}
+                        ),
         
-        # Column 3
-        html.Div(
-            Plot_Treemap,
-            style={'width': '40%', 'height': '455px', 'border-bottom': '0.5px solid silver'}
-            ),
+            # Column 2
+            html.Div(
+                Plot_Household_Time, 
+                style={'width': '40%', 'height': '455px', 'border-right': '0.5px solid silver', 
+                       'border-bottom': '0.5px solid silver'}
+                        ),
+        
+            # Column 3
+            html.Div(
+                [treemap_graph(dataset),
+                 treemap_slider(dataset)],
+                style={'width': '40%', 'height': '455px', 'border-bottom': '0.5px solid silver'}
+                ),
+                ], 
+                 style={'display': 'flex', 'height': '455px'}),
+
+    #-----------------------------------------------------------------------------------
+    
+        # Row 6 (only displayed when a vintage store is configured, see above)
+        html.Div(children=[
+        
+            # Column 1
+            html.Div(
+                [html.Div(html.Strong("Compare Vintages:")), 
+                 old_vintage_dropdown, new_vintage_dropdown,
+                 html.Div(html.Strong("Select Series:"), style={'margin-top': '10px'}), 
+                 vintage_series_dropdown],
+                style={'width': '20%', 'height': '455px', 'border-right': '3px solid black', 
+                       'border-bottom': '0.5px solid silver', "padding":"20px", 
+                       'background-color': 'lavender'}
+                        ),
+        
+            # Column 2
+            html.Div(Plot_Vintage_Revisions, style={'width': '80%', 'height': '455px', 'border-bottom': '0.5px solid silver'}),
             ], 
-             style={'display': 'flex', 'height': '455px'}),
+            style={'display': 'flex', 'height': '455px'} if vintage_store is not None else {'display': 'none'}),
+
+                ])
 
-            ])
+app.layout = serve_layout
 
 # -------------------------------------------------------------------------------
 # Execute the dashboard
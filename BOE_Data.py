@@ -11,14 +11,19 @@
 import pandas as pd
 import numpy as np
 from scipy.stats import zscore
+import os
 import pickle
+import argparse
+from datetime import date
 
 # -------------------------------------------------------------------------------
 # Import additional functions from our own BOE_Utilities module
 # -------------------------------------------------------------------------------
 
 # Import functions from BOE_Utilities module
-from BOE_Utilities import create_combined_dataframe, tidy_the_dataframe, rename_columns, create_percentage_change_df
+from BOE_Utilities import create_combined_dataframe, tidy_the_dataframe, rename_columns, create_percentage_change_df, StageProfiler
+from BOE_Utilities import create_treemap_hierarchy, create_rollups
+from BOE_Vintages import VintageStore
 
 # -------------------------------------------------------------------------------
 # Use BOE_Utilities module to create a fully combined and transformed dataframe
@@ -47,113 +52,229 @@ Define a CHAIN OF FUNCTIONS that have been imported from our BOE_Utilities modul
 This chain of functions receives the source excel file and the column_mapping (above) and then \
 combines and transforms the source excel data into a dataframe that will subsequently be used to \
 generate other useful dataframes and plots.
+Each function is run through a StageProfiler, so that (when profiling is switched on) the CPU time and \
+peak memory of every stage can be reported.
 """
-def create_df_gdp(file_name, column_mapping):
-    df = create_combined_dataframe(file_name)
-    df = tidy_the_dataframe(df)
-    df = rename_columns(df, column_mapping)
+def create_df_gdp(file_name, column_mapping, profiler=None, project_columns=True):
+    profiler = profiler or StageProfiler()
+    # Projected ingestion: only the columns named in column_mapping are read from the source file.
+    # (All of the downstream derivations work on the renamed columns, so nothing else is ever referenced.)
+    columns = column_mapping.keys() if project_columns else None
+    df = profiler.run('create_combined_dataframe', create_combined_dataframe, file_name, columns)
+    df = profiler.run('tidy_the_dataframe', tidy_the_dataframe, df)
+    df = profiler.run('rename_columns', rename_columns, df, column_mapping)
     return df
-    
-# EXECUTE the chain of functions and assign the resulting dataframe
-df_GDP = create_df_gdp(file_name=file_name, column_mapping=column_mapping)
 
 # -------------------------------------------------------------------------------
-# Manually identify meaningful groupings of columns (used in subsequent plots)
+# Define a function that creates a duplicate df containing absolute values of GDP components (used in subsequent plots)
 # -------------------------------------------------------------------------------
 
-# Define a list of the columns that are the top-level *components* of GDP.
-GDP_Components = list(df_GDP.columns)[:6]
-# This list will be used later, when creating plots
-
-# Define a list of the columns that are the top-level *components* of Household Spend.
-Household_Components = list(df_GDP.columns)[-5:]
-# This list will be used later, when creating plots
+def create_components_abs_df(df_GDP, GDP_Components):
+    df_GDPComponents_Abs = abs(df_GDP[GDP_Components])
+    row_sums = df_GDPComponents_Abs.sum(axis=1)
+    df_GDPComponents_Abs = df_GDPComponents_Abs.div(row_sums, axis=0) * 100
+    # Note: the resulting dataframe calculates what proportion of the total absolute GDP values each component contributes.
+    return df_GDPComponents_Abs
 
 # -------------------------------------------------------------------------------
-# Use BOE_Utilities to create duplicate dataframes containing % change values (used in subsequent plots)
+# Define a function that creates and tweaks a duplicate dataframe to feed a "treemap" (used in subsequent plots)
 # -------------------------------------------------------------------------------
 
-# Run function to create duplicate dataframe containing percentage changes versus preceding quarter.
-df_GDP_QvPriorQ = create_percentage_change_df(df_GDP, 1)
+# The columns that are critical for building the treemap, and the top-level hierarchy (parent) of each.
+# Please look at an example treemap to grasp the concept of hierarchy.
+treemap_parent_mapping = {
+    "Household_Component_Durables": "Household_Spend",
+    "Household_Component_SemiDurables": "Household_Spend",
+    "Household_Component_NonDurables": "Household_Spend",
+    "Household_Component_Services": "Household_Spend",
+    "Household_Component_Other": "Household_Spend",
+    "GDP_Component_Gov_Spend": "Non_Household_Spend",
+    "GDP_Component_GFCF": "Non_Household_Spend",
+    "GDP_Component_Inventories": "Non_Household_Spend",
+    "GDP_Component_TradeBalance": "Non_Household_Spend",
+    "GDP_Component_Other": "Non_Household_Spend"}
+
+def create_treemap_df(df_GDP):
+    # Select the most recent row
+    recent_row = df_GDP.iloc[-1]
+
+    # identify the columns that are critical for building the treemap (those that this dataset's column_mapping provides)
+    columns_to_include = [column for column in treemap_parent_mapping if column in df_GDP.columns]
+
+    # Create a DataFrame with one row containing the values from the most recent row
+    df_treemap = pd.DataFrame(recent_row[columns_to_include]).reset_index()
+
+    # Rename columns for brevity/clarity
+    df_treemap.columns = ['Component', 'Value']
+
+    # Treemap's cannot accept negative values - therefore we must ensure all values are positive
+    df_treemap["Value"] = abs(df_treemap["Value"])
+
+    # Create a new column (parent_component); this serves as the top-level hierarchy for the treemap.
+    # Please look at an example treemap to grasp the concept of hierarchy.
+    df_treemap["Parent_Component"] = df_treemap["Component"]
 
-# Run function to create duplicate dataframe containing percentage changes versus the quarter in the previous year.
-df_GDP_QvPriorY = create_percentage_change_df(df_GDP, 4)
+    # Set the appropriate values for Parent_Component column (see treemap_parent_mapping, above).
+    # For example, the top-level hierarchy for "Household_Durables" is "Household_Spend".
+    df_treemap["Parent_Component"] = df_treemap["Parent_Component"].replace(treemap_parent_mapping)
+
+    # The following values must be removed from "Parent_Component", to improve the aesthetics of the eventual treemap.
+    values_to_remove = ['GDP_Component_Gov_Spend', 'GDP_Component_GFCF', 
+                        'GDP_Component_Inventories', 'GDP_Component_TradeBalance',
+                        'GDP_Component_Other']
+    df_treemap['Parent_Component'] = df_treemap['Parent_Component'].replace(values_to_remove, '')
+
+    # Introduce line breaks in the Component column - to  improve the aesthetics of the eventual treemap.
+    df_treemap['Component'] = df_treemap['Component'].str.replace('_', '<br>')
+
+    return df_treemap
 
 # -------------------------------------------------------------------------------
-# Create a duplicate df containing absolute values of GDP components (used in subsequent plots)
+# Define the coarser resolutions (in years) at which df_GDP and df_GDPComponents_Abs are pre-aggregated
 # -------------------------------------------------------------------------------
 
-df_GDPComponents_Abs = abs(df_GDP[GDP_Components])
-row_sums = df_GDPComponents_Abs.sum(axis=1)
-df_GDPComponents_Abs = df_GDPComponents_Abs.div(row_sums, axis=0) * 100
-# Note: the resulting dataframe calculates what proportion of the total absolute GDP values each component contributes.
+# When a user selects a wide range of years, the dashboard serves the finest of these resolutions that keeps the plot small.
+rollup_resolutions = {'annual': 1, '5_year': 5, '10_year': 10}
 
 # -------------------------------------------------------------------------------
-# Create and tweak a duplicate dataframe to feed a "treemap" (used in subsequent plots)
+# Define a function that identifies the components of GDP (or of Household Spend) from the column_mapping
 # -------------------------------------------------------------------------------
 
-# Select the most recent row
-recent_row = df_GDP.iloc[-1]
+# The groupings are read from the names that column_mapping gives the columns, rather than from their positions,
+# so that any column_mapping works: the top-level components of GDP must be named "GDP_Component_...", and the
+# top-level components of Household Spend "Household_Component_..." (as in the column_mapping above).
+def components_in_mapping(df_GDP, column_mapping, prefix):
+    renamed = set(column_mapping.values())
+    return [column for column in df_GDP.columns if column in renamed and column.startswith(prefix)]
 
-# identify the columns that are critical for building the treemap
-columns_to_include = ["Household_Component_Durables", "Household_Component_SemiDurables", "Household_Component_NonDurables", 
-                      "Household_Component_Services", "Household_Component_Other", "GDP_Component_Gov_Spend", 
-                      "GDP_Component_GFCF", "GDP_Component_Inventories", "GDP_Component_TradeBalance", 
-                      "GDP_Component_Other"]
+# -------------------------------------------------------------------------------
+# Define a function that runs the whole pipeline and bundles the dataframes and lists it creates
+# -------------------------------------------------------------------------------
 
-# Create a DataFrame with one row containing the values from the most recent row
-df_treemap = pd.DataFrame(recent_row[columns_to_include]).reset_index()
+def create_data_bundle(file_name, column_mapping, profiler=None, project_columns=True, as_of_state=None):
+    """
+    "as_of_state" (optional) is the "as_of_state" of the previous bundle: the state of the incremental as-of \
+    statistics (see add_as_of_columns in BOE_Utilities), so that only the quarters added since then are computed.
+    """
+    profiler = profiler or StageProfiler()
+    as_of_state = {key: dict((as_of_state or {}).get(key) or {}) for key in ['df_GDP_QvPriorQ', 'df_GDP_QvPriorY']}
 
-# Rename columns for brevity/clarity
-df_treemap.columns = ['Component', 'Value']
+    # EXECUTE the chain of functions and assign the resulting dataframe
+    df_GDP = create_df_gdp(file_name=file_name, column_mapping=column_mapping, profiler=profiler,
+                           project_columns=project_columns)
 
-# Treemap's cannot accept negative values - therefore we must ensure all values are positive
-df_treemap["Value"] = abs(df_treemap["Value"])
+    # -------------------------------------------------------------------------------
+    # Manually identify meaningful groupings of columns (used in subsequent plots)
+    # -------------------------------------------------------------------------------
 
-# Create a new column (parent_component); this serves as the top-level hierarchy for the treemap.
-# Please look at an example treemap to grasp the concept of hierarchy.
-df_treemap["Parent_Component"] = df_treemap["Component"]
+    # Define a list of the columns that are the top-level *components* of GDP.
+    GDP_Components = components_in_mapping(df_GDP, column_mapping, 'GDP_Component_')
+    # This list will be used later, when creating plots
 
-# Set the appropriate values for Parent_Component column.
-# For example, the top-level hierarchy for "Household_Durables" is "Household_Spend".
-mapping = {
-    "Household_Component_Durables": "Household_Spend",
-    "Household_Component_SemiDurables": "Household_Spend",
-    "Household_Component_NonDurables": "Household_Spend",
-    "Household_Component_Services": "Household_Spend",
-    "Household_Component_Other": "Household_Spend",
-    "GDP_Component_Gov_Spend": "Non_Household_Spend",
-    "GDP_Component_GFCF": "Non_Household_Spend",
-    "GDP_Component_Inventories": "Non_Household_Spend",
-    "GDP_Component_TradeBalance": "Non_Household_Spend",
-    "GDP_Component_Other": "Non_Household_Spend"}
-df_treemap["Parent_Component"] = df_treemap["Parent_Component"].replace(mapping)
+    # Define a list of the columns that are the top-level *components* of Household Spend.
+    Household_Components = components_in_mapping(df_GDP, column_mapping, 'Household_Component_')
+    # This list will be used later, when creating plots
+
+    # -------------------------------------------------------------------------------
+    # Use BOE_Utilities to create duplicate dataframes containing % change values (used in subsequent plots)
+    # -------------------------------------------------------------------------------
+
+    # Run function to create duplicate dataframe containing percentage changes versus preceding quarter.
+    df_GDP_QvPriorQ = profiler.run('create_percentage_change_df_prior_q', create_percentage_change_df, df_GDP, 1,
+                                   as_of_state=as_of_state['df_GDP_QvPriorQ'])
 
-# The following values must be removed from "Parent_Component", to improve the aesthetics of the eventual treemap.
-values_to_remove = ['GDP_Component_Gov_Spend', 'GDP_Component_GFCF', 
-                    'GDP_Component_Inventories', 'GDP_Component_TradeBalance',
-                    'GDP_Component_Other']
-df_treemap['Parent_Component'] = df_treemap['Parent_Component'].replace(values_to_remove, '')
+    # Run function to create duplicate dataframe containing percentage changes versus the quarter in the previous year.
+    df_GDP_QvPriorY = profiler.run('create_percentage_change_df_prior_y', create_percentage_change_df, df_GDP, 4,
+                                   as_of_state=as_of_state['df_GDP_QvPriorY'])
 
-# Introduce line breaks in the Component column - to  improve the aesthetics of the eventual treemap.
-df_treemap['Component'] = df_treemap['Component'].str.replace('_', '<br>')
+    # -------------------------------------------------------------------------------
+    # Create the remaining derived dataframes (used in subsequent plots)
+    # -------------------------------------------------------------------------------
+
+    df_GDPComponents_Abs = profiler.run('create_components_abs_df', create_components_abs_df, df_GDP, GDP_Components)
+
+    df_treemap = profiler.run('create_treemap_df', create_treemap_df, df_GDP)
+
+    # Precompute the treemap's values for every quarter, so the dashboard can scrub through time
+    treemap_hierarchy = profiler.run('create_treemap_hierarchy', create_treemap_hierarchy, df_GDP,
+                                     {column: parent for column, parent in treemap_parent_mapping.items() if column in df_GDP.columns})
+
+    # Precompute the annual and multi-year rollups (levels are averaged; shares are re-derived from the rolled-up levels)
+    rollups = profiler.run('create_rollups', create_rollups, df_GDP, GDP_Components, rollup_resolutions)
+
+    # -------------------------------------------------------------------------------
+    # Bundle the dataframes and lists created above. This bundle will feed the dashboard.
+    # -------------------------------------------------------------------------------
+
+    data_bundle = {
+        'df_GDP': df_GDP,
+        'df_GDP_QvPriorY': df_GDP_QvPriorY,
+        'df_GDP_QvPriorQ': df_GDP_QvPriorQ,
+        'df_GDPComponents_Abs': df_GDPComponents_Abs,
+        'Household_Components': Household_Components,
+        'GDP_Components': GDP_Components,
+        'df_treemap': df_treemap,
+        'treemap_hierarchy': treemap_hierarchy,
+        'rollups': rollups,
+        'column_mapping': dict(column_mapping),  # Used by the dashboard's series search (see "BOE_Search.py")
+        'as_of_state': as_of_state}              # Lets the next run compute only the new quarters' as-of statistics
+
+    return data_bundle
 
 # -------------------------------------------------------------------------------
-# Bundle the dataframes and lists created above, and "pickle" them. This bundle will feed the dashboard.
+# Command-line entry point: run the pipeline and "pickle" the bundle
 # -------------------------------------------------------------------------------
 
-data_bundle = {
-    'df_GDP': df_GDP,
-    'df_GDP_QvPriorY': df_GDP_QvPriorY,
-    'df_GDP_QvPriorQ': df_GDP_QvPriorQ,
-    'df_GDPComponents_Abs': df_GDPComponents_Abs,
-    'Household_Components': Household_Components,
-    'GDP_Components': GDP_Components,
-    'df_treemap': df_treemap}
-
-# Save the bundle-dictionary to a pickle file
-with open('data_bundle.pickle', 'wb') as f:
-    pickle.dump(data_bundle, f)
+"""
+Running this script with no arguments behaves exactly as before: the source file is loaded and transformed, \
+and the resulting bundle is saved to "data_bundle.pickle".
+Profiling switches (useful when the pipeline is slow on a big workbook):
+    python BOE_Data.py --profile                       # report CPU time and peak memory for every stage
+    python BOE_Data.py --profile-dir profiles          # ...and also write one cProfile file per stage
+By default only the columns named in column_mapping are read from the source file (projected ingestion); \
+use --all-columns to read every column of every sheet instead.
+Each release's df_GDP can also be kept, as a compact delta, in an append-only vintage store (see BOE_Vintages.py):
+    python BOE_Data.py --vintage-store vintage_store --vintage 2024-03-28
+"""
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load, clean and transform the source data into a data bundle.')
+    parser.add_argument('--file-name', default=file_name, help='source Excel file')
+    parser.add_argument('--output', default='data_bundle.pickle', help='where to save the pickled data bundle')
+    parser.add_argument('--profile', action='store_true', help='report CPU time and peak memory for every stage')
+    parser.add_argument('--profile-dir', default=None, help='also write a cProfile file per stage to this directory')
+    parser.add_argument('--all-columns', action='store_true',
+                        help='read every column of every sheet, rather than only the columns in column_mapping')
+    parser.add_argument('--vintage-store', default=None, help='append df_GDP to the vintage store in this directory')
+    parser.add_argument('--vintage', default=str(date.today()), help='vintage (release) date, YYYY-MM-DD')
+    args = parser.parse_args(argv)
+
+    # The state of the as-of statistics is carried over from the previous bundle (if there is one), so that only the
+    # quarters added since then are computed
+    as_of_state = None
+    if os.path.exists(args.output):
+        try:
+            with open(args.output, 'rb') as f:
+                as_of_state = pickle.load(f).get('as_of_state')
+        except Exception as e:
+            print(f"Error: could not read the as-of state of the previous bundle ({e}); computing it from scratch.")
+
+    profiler = StageProfiler(enabled=args.profile, profile_dir=args.profile_dir)
+    data_bundle = create_data_bundle(args.file_name, column_mapping, profiler=profiler,
+                                     project_columns=not args.all_columns, as_of_state=as_of_state)
+
+    # Save the bundle-dictionary to a pickle file
+    # Write to a temporary file first, so that a running dashboard never reads a half-written bundle (see "BOE_Live.py")
+    with open(args.output + '.tmp', 'wb') as f:
+        pickle.dump(data_bundle, f)
+    os.replace(args.output + '.tmp', args.output)
     print("Data bundle saved successfully.")
-# This pickle file will subsequently be fed through to the dashboard script ("BOE_Dash.py")
+    # This pickle file will subsequently be fed through to the dashboard script ("BOE_Dash.py")
+
+    # Keep this release's df_GDP in the vintage store (only the new / revised values are written)
+    if args.vintage_store is not None:
+        VintageStore(args.vintage_store).append(data_bundle['df_GDP'], args.vintage)
+
+    profiler.print_summary()
 
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,360 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+# -------------------------------------------------------------------------------
+# Import additional Python functionality / various libraries
+# -------------------------------------------------------------------------------
+
+import argparse
+import itertools
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import plotly
+from plotly.offline import get_plotlyjs
+
+"""
+Static export of every dashboard state.
+
+The dashboard's input space is small and finite: two periodicities, three Z-score bases, pairs of years, two plot types, two outlier \
+modes, three colour schemes, a handful of GDP components, and the subsets of household components. Rather than \
+taking the cartesian product of every input, each figure is rendered once for every combination of the inputs \
+IT depends on (e.g. the heatmap only depends on the periodicity), which keeps the export to tens of thousands \
+of figures rather than billions.
+
+Figures are rendered in parallel across a process pool, by the dashboard's own callback functions, and written \
+as JSON files. A self-contained static site (index.html, app.js, plotly.min.js and the figures) is written \
+alongside; in the browser, changing an input simply fetches and swaps in the precomputed figure JSON - so the \
+site can be served from any file server, with no Python on the request path.
+
+Example:
+    python BOE_Export.py --output static_site --workers 8
+    python -m http.server --directory static_site     # preview locally
+"""
+
+# -------------------------------------------------------------------------------
+# Define how each figure's inputs map on to the dashboard's callback functions
+# -------------------------------------------------------------------------------
+
+"""
+For each exported figure: the dashboard callback that renders it, and the (ordered) list of inputs it depends on.
+The static site builds the file name of a figure from the current values of the same inputs, in the same order.
+"""
+EXPORTED_FIGURES = {
+    'Plot_GDP_Heatmap': ('update_heatmap', ['radio-display']),
+    'Plot_GDP_histogram': ('update_histogram', ['radio-display', 'radio-zscore-basis']),
+    'Plot_GDP_Time': ('update_gdp_time_plot', ['radio-display', 'radio-plot-type', 'radio-outlier-handling',
+                                               'start-year-dropdown', 'end-year-dropdown']),
+    'Plot_GDP_Stacks': ('update_stacked_bar_chart', ['start-year-dropdown', 'end-year-dropdown', 'color-scheme-dropdown']),
+    'Plot_GDP_Components': ('update_bar_chart', ['Buttons_Components', 'start-year-dropdown', 'end-year-dropdown']),
+    'Plot_Household_Time': ('update_line_plot', ['component-checkboxes']),
+    }
+
+def figure_key(values):
+    # The file name (without extension) of the figure for the given input values.
+    # A checklist's value (a list of selected components) is encoded as a bit mask over its options, e.g. "10110".
+    return '__'.join(str(value) for value in values)
+
+def checklist_mask(selected, options):
+    return ''.join('1' if option in selected else '0' for option in options)
+
+# -------------------------------------------------------------------------------
+# Define the enumeration of every reachable combination of inputs
+# -------------------------------------------------------------------------------
+
+"""
+The household checklist is exported as every subset of its components (2 ** n figures), and every checkbox is \
+written into the page; the export is therefore only offered for checklists of up to MAX_HOUSEHOLD_COMPONENTS \
+components (4,096 subsets). Larger datasets should be served by the live dashboard, which pages its checklist.
+"""
+MAX_HOUSEHOLD_COMPONENTS = 12
+
+def option_values(component):
+    return [option['value'] if isinstance(option, dict) else option for option in component.options]
+
+def enumerate_inputs(dash_module, dataset, start_year=None, end_year=None):
+    # The values every input can take, for the given dataset
+    years = [option['value'] for option in dash_module.year_options(dataset)]
+    years = [year for year in years if (start_year is None or year >= start_year) and (end_year is None or year <= end_year)]
+    households = [option['value'] for option in dash_module.household_options(dataset)]
+    if len(households) > MAX_HOUSEHOLD_COMPONENTS:
+        raise ValueError(f"dataset '{dataset.id}' has {len(households)} household components; the static export "
+                         f"enumerates every subset of them and supports at most {MAX_HOUSEHOLD_COMPONENTS} "
+                         f"({2 ** MAX_HOUSEHOLD_COMPONENTS} figures) - use the live dashboard for this dataset")
+    input_values = {
+        'radio-display': option_values(dash_module.radio_display),
+        'radio-zscore-basis': option_values(dash_module.radio_zscore_basis),
+        'radio-plot-type': option_values(dash_module.radio_plot_type),
+        'radio-outlier-handling': option_values(dash_module.radio_outlier_handling),
+        'color-scheme-dropdown': option_values(dash_module.color_scheme_dropdown),
+        'Buttons_Components': [option['value'] for option in dash_module.component_options(dataset)],
+        }
+    return years, households, input_values
+
+def enumerate_jobs(dash_module, dataset, start_year=None, end_year=None):
+    # Every (figure, key, callback arguments) combination that the dashboard's inputs can reach
+    years, households, input_values = enumerate_inputs(dash_module, dataset, start_year, end_year)
+    # Only start <= end year pairs are rendered; the static site shows an empty figure for the (empty) reversed ranges
+    year_pairs = [(start, end) for start in years for end in years if start <= end]
+
+    jobs = []
+    for output_id, (callback_name, inputs) in EXPORTED_FIGURES.items():
+        if inputs == ['component-checkboxes']:
+            for selected in itertools.product([False, True], repeat=len(households)):
+                components = [component for component, flag in zip(households, selected) if flag]
+                jobs.append((output_id, checklist_mask(components, households), callback_name, (components,)))
+            continue
+
+        # Expand the year dropdowns as (start, end) pairs, and every other input over its values
+        spaces = []
+        for input_id in inputs:
+            if input_id == 'start-year-dropdown':
+                spaces.append(year_pairs)
+            elif input_id != 'end-year-dropdown':
+                spaces.append([(value,) for value in input_values[input_id]])
+        for combination in itertools.product(*spaces):
+            values = tuple(itertools.chain.from_iterable(combination))
+            jobs.append((output_id, figure_key(values), callback_name, values))
+    return jobs
+
+# -------------------------------------------------------------------------------
+# Define the worker processes that render the figures
+# -------------------------------------------------------------------------------
+
+worker_state = {}
+
+def initialise_worker(output_dir, dataset_id):
+    # Each worker imports the dashboard once, then renders many figures with its callback functions
+    import BOE_Dash
+    worker_state['dash'] = BOE_Dash
+    worker_state['output_dir'] = output_dir
+    worker_state['dataset_id'] = dataset_id
+
+def render_jobs(jobs):
+    dash_module = worker_state['dash']
+    written = 0
+    for output_id, key, callback_name, values in jobs:
+        figure = getattr(dash_module, callback_name)(*values, dataset_id=worker_state['dataset_id'])
+        figure_json = json.dumps(figure, cls=plotly.utils.PlotlyJSONEncoder)
+        with open(os.path.join(worker_state['output_dir'], 'figures', output_id, f'{key}.json'), 'w') as f:
+            f.write(figure_json)
+        written += len(figure_json)
+    return len(jobs), written
+
+def chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+# -------------------------------------------------------------------------------
+# Define the static site (the page, its controls, and the script that swaps the figures)
+# -------------------------------------------------------------------------------
+
+APP_JS = """
+// Swap in the precomputed figure for the current input values (see BOE_Export.py)
+const manifest = await (await fetch('manifest.json')).json();
+
+function inputValue(inputId) {
+    if (inputId === 'component-checkboxes') {
+        const options = manifest.checklist_options;
+        return options.map(option => document.querySelector(`input[name="${inputId}"][value="${option}"]`).checked ? '1' : '0').join('');
+    }
+    const radio = document.querySelector(`input[name="${inputId}"]:checked`);
+    return radio ? radio.value : document.getElementById(inputId).value;
+}
+
+async function renderFigure(outputId) {
+    const inputs = manifest.figures[outputId];
+    const values = inputs.map(inputValue);
+    const start = inputs.indexOf('start-year-dropdown');
+    if (start >= 0 && Number(values[start]) > Number(values[inputs.indexOf('end-year-dropdown')])) {
+        Plotly.react(outputId, [], {title: 'The start year is after the end year'});
+        return;
+    }
+    const response = await fetch(`figures/${outputId}/${values.join('__')}.json`);
+    const figure = await response.json();
+    Plotly.react(outputId, figure.data, figure.layout);
+}
+
+function renderTreemap() {
+    const position = Number(document.getElementById('treemap-quarter-slider').value);
+    const figure = manifest.treemap.figure;
+    figure.data[0].values = manifest.treemap.values[position];
+    figure.layout.title.text = manifest.treemap.title.replace('{}', manifest.treemap.quarters[position]);
+    Plotly.react('Plot_Treemap', figure.data, figure.layout);
+}
+
+for (const outputId of Object.keys(manifest.figures)) {
+    for (const inputId of manifest.figures[outputId]) {
+        document.querySelectorAll(`[name="${inputId}"], #${inputId}`).forEach(
+            element => element.addEventListener('change', () => renderFigure(outputId)));
+    }
+    renderFigure(outputId);
+}
+document.getElementById('treemap-quarter-slider').addEventListener('input', renderTreemap);
+renderTreemap();
+"""
+
+def html_radio(input_id, options, value):
+    return ''.join(f'<label style="display:block"><input type="radio" name="{input_id}" value="{option["value"]}"'
+                   f'{" checked" if option["value"] == value else ""}> {option["label"]}</label>' for option in options)
+
+def html_select(input_id, options, value):
+    return (f'<select id="{input_id}" name="{input_id}" style="width:100%">' +
+            ''.join(f'<option value="{option["value"]}"{" selected" if str(option["value"]) == str(value) else ""}>'
+                    f'{option["label"]}</option>' for option in options) + '</select>')
+
+def html_checklist(input_id, options, values):
+    return ''.join(f'<label style="display:block"><input type="checkbox" name="{input_id}" value="{option["value"]}"'
+                   f'{" checked" if option["value"] in values else ""}> {option["label"]}</label>' for option in options)
+
+def build_index_html(dash_module, dataset, years):
+    # The page mirrors the dashboard's five rows: a lavender control column, then the figures
+    year_options = [{'label': str(year), 'value': year} for year in years]
+    default_start = max(min(years), min(int(dash_module.default_year), max(years)))
+    controls = {
+        'row1': '<h3>' + dash_module.app.title + '</h3><strong>Select Periodicity:</strong>' +
+                html_radio('radio-display', dash_module.radio_display.options, dash_module.radio_display.value) +
+                '<strong>Measure Z-scores Against:</strong>' +
+                html_radio('radio-zscore-basis', dash_module.radio_zscore_basis.options,
+                           dash_module.radio_zscore_basis.value),
+        'row2': '<strong>Period Of Investigation:</strong>' +
+                html_select('start-year-dropdown', year_options, default_start) +
+                html_select('end-year-dropdown', year_options, max(years)) +
+                '<strong>Select Plot Type:</strong>' +
+                html_radio('radio-plot-type', dash_module.radio_plot_type.options, dash_module.radio_plot_type.value) +
+                '<strong>Combat Outliers?</strong>' +
+                html_radio('radio-outlier-handling', dash_module.radio_outlier_handling.options,
+                           dash_module.radio_outlier_handling.value),
+        'row3': '<strong>Color Scheme:</strong>' +
+                html_select('color-scheme-dropdown', dash_module.color_scheme_dropdown.options,
+                            dash_module.color_scheme_dropdown.value),
+        'row4': '<strong>Select GDP Component:</strong>' +
+                html_select('Buttons_Components', dash_module.component_options(dataset),
+                            dash_module.default_component_of(dataset)),
+        'row5': '<strong>Select Household Components:</strong>' +
+                html_checklist('component-checkboxes', dash_module.household_options(dataset),
+                               dash_module.default_household_selection(dataset)),
+        }
+    last_quarter = len(dataset['treemap_hierarchy']['periods']) - 1
+    figures = {
+        'row1': ['Plot_GDP_Heatmap', 'Plot_GDP_histogram'],
+        'row2': ['Plot_GDP_Time'],
+        'row3': ['Plot_GDP_Stacks'],
+        'row4': ['Plot_GDP_Components'],
+        'row5': ['Plot_Household_Time', 'Plot_Treemap'],
+        }
+    rows = []
+    for row, control_html in controls.items():
+        width = 80 // len(figures[row])
+        figure_html = ''.join(f'<div style="width:{width}%;height:455px"><div id="{output_id}" style="height:'
+                              f'{"390px" if output_id == "Plot_Treemap" else "455px"}"></div>' +
+                              (f'<input type="range" id="treemap-quarter-slider" min="0" max="{last_quarter}" '
+                               f'value="{last_quarter}" style="width:90%">' if output_id == 'Plot_Treemap' else '') +
+                              '</div>' for output_id in figures[row])
+        rows.append(f'<div style="display:flex;height:455px;border-bottom:0.5px solid silver">'
+                    f'<div style="width:20%;padding:20px;background-color:lavender;border-right:3px solid black">'
+                    f'{control_html}</div>{figure_html}</div>')
+    return (f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>{dash_module.app.title}</title>'
+            f'<script src="plotly.min.js"></script></head><body style="font-family:sans-serif;margin:0">'
+            f'{"".join(rows)}<script type="module" src="app.js"></script></body></html>')
+
+def build_manifest(dash_module, dataset):
+    # Which inputs each figure depends on, plus everything the treemap slider needs to swap its values client-side
+    fig_treemap, treemap_node_positions = dash_module.create_treemap_figure(dataset)
+    treemap_hierarchy = dataset['treemap_hierarchy']
+    return {
+        'figures': {output_id: inputs for output_id, (_, inputs) in EXPORTED_FIGURES.items()},
+        'checklist_options': [option['value'] for option in dash_module.household_options(dataset)],
+        'treemap': {
+            'figure': json.loads(json.dumps(fig_treemap, cls=plotly.utils.PlotlyJSONEncoder)),
+            'title': dash_module.treemap_title,
+            'quarters': [f'{period.year} Q{period.quarter}' for period in treemap_hierarchy['periods']],
+            'values': treemap_hierarchy['values'][:, treemap_node_positions].tolist(),
+            },
+        }
+
+# -------------------------------------------------------------------------------
+# Define the functions that write the whole site, and swap it into place
+# -------------------------------------------------------------------------------
+
+def write_site(dash_module, dataset, years, jobs, output_dir, workers, chunk_size):
+    for output_id in EXPORTED_FIGURES:
+        os.makedirs(os.path.join(output_dir, 'figures', output_id), exist_ok=True)
+
+    # Render the figures in parallel
+    started = time.time()
+    rendered = written = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=initialise_worker,
+                             initargs=(output_dir, dataset.id)) as pool:
+        for count, size in pool.map(render_jobs, chunks(jobs, chunk_size)):
+            rendered += count
+            written += size
+    print(f"{rendered} figures ({written / 1024 ** 2:.1f} MiB) rendered in {time.time() - started:.1f}s.")
+
+    # Write the page, its script, the plotly.js library and the manifest
+    with open(os.path.join(output_dir, 'index.html'), 'w') as f:
+        f.write(build_index_html(dash_module, dataset, years))
+    with open(os.path.join(output_dir, 'app.js'), 'w') as f:
+        f.write(APP_JS)
+    with open(os.path.join(output_dir, 'plotly.min.js'), 'w') as f:
+        f.write(get_plotlyjs())
+    with open(os.path.join(output_dir, 'manifest.json'), 'w') as f:
+        json.dump(build_manifest(dash_module, dataset), f)
+
+def replace_directory(new_dir, output_dir):
+    # Move any previous site aside, move the new one into its place, then delete the previous site.
+    # (Both moves are renames within the same parent directory, so the site is missing only for an instant.)
+    os.chmod(new_dir, 0o755)  # tempfile creates the directory readable by its owner only
+    previous_dir = f'{output_dir}.previous-{os.getpid()}'
+    if os.path.exists(output_dir):
+        os.rename(output_dir, previous_dir)
+    os.rename(new_dir, output_dir)
+    shutil.rmtree(previous_dir, ignore_errors=True)
+
+# -------------------------------------------------------------------------------
+# Command-line entry point
+# -------------------------------------------------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Render every dashboard state into a self-contained static site.')
+    parser.add_argument('--output', default='static_site', help='directory to write the static site to')
+    parser.add_argument('--dataset', default=None, help='dataset id to export (default: the first dataset)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('--chunk-size', type=int, default=50, help='figures rendered per task sent to a worker')
+    parser.add_argument('--start-year', type=int, default=None, help='only export years from this year onwards')
+    parser.add_argument('--end-year', type=int, default=None, help='only export years up to this year')
+    args = parser.parse_args(argv)
+
+    import BOE_Dash
+    dataset = BOE_Dash.registry.get(args.dataset)
+    try:
+        years, _, _ = enumerate_inputs(BOE_Dash, dataset, args.start_year, args.end_year)
+        jobs = enumerate_jobs(BOE_Dash, dataset, args.start_year, args.end_year)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 1
+    print(f"Exporting {len(jobs)} figures for dataset '{dataset.id}' with {args.workers} workers.")
+
+    # The site is written to a temporary directory alongside the output directory, then swapped in as a whole:
+    # figures from an earlier export (e.g. over other years) never linger, and a failed export changes nothing
+    output = os.path.abspath(args.output)
+    staging = tempfile.mkdtemp(prefix=f'.{os.path.basename(output)}.', dir=os.path.dirname(output))
+    try:
+        write_site(BOE_Dash, dataset, years, jobs, staging, args.workers, args.chunk_size)
+        replace_directory(staging, output)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    print(f"Static site written to: {args.output}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
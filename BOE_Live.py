@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+# -------------------------------------------------------------------------------
+# Import additional Python functionality / various libraries
+# -------------------------------------------------------------------------------
+
+import json
+import threading
+import time
+
+import flask
+
+"""
+Push-based live updates: connected dashboards are told when a dataset's bundle changes (e.g. a new vintage lands).
+
+A single watcher thread per server process checks the version of every dataset's source file (a cheap os.stat, \
+see "BOE_Registry.py") every few seconds. When a version changes, the registry reloads the bundle and records \
+which of its keys changed, and every connected browser is notified over a server-sent events stream:
+    GET /events     - a "text/event-stream" of "bundle-version" events, whose data is {dataset id: version}
+The browser (see "assets/BOE_live_updates.js") passes each new version to the dashboard's "bundle-version" store, \
+and only the figures built from the changed parts of the bundle are re-rendered.
+Idle tabs cost nothing but an open connection (and a keep-alive comment every KEEPALIVE_SECONDS), rather than \
+a polling request every few seconds.
+
+Each open stream occupies a connection on the server for up to MAX_STREAM_SECONDS. Under gunicorn's default "sync" \
+workers, that is a whole worker per open tab, and every other request queues behind them. Live updates are \
+therefore opt-in (BOE_LIVE_UPDATES=1, see "BOE_Dash.py"), and require a threaded or async worker class, e.g.:
+    gunicorn --worker-class gthread --threads 50 BOE_Dash:server
+    gunicorn --worker-class gevent --worker-connections 1000 BOE_Dash:server
+The check interval (in seconds) is given by the BOE_LIVE_UPDATE_INTERVAL environment variable (default 5).
+Each server process reloads a changed bundle on its own, the next time it is used (see "BOE_Registry.py"), so a \
+request handled by a process without a watcher still sees the new version.
+"""
+
+# Send a comment at least this often, so that proxies do not close an idle stream
+KEEPALIVE_SECONDS = 15
+
+# Close each stream after this long; the browser reconnects automatically (after RETRY_MILLISECONDS)
+MAX_STREAM_SECONDS = 600
+RETRY_MILLISECONDS = 5000
+
+# -------------------------------------------------------------------------------
+# Define the watcher, which checks the versions of the datasets' source files
+# -------------------------------------------------------------------------------
+
+class BundleWatcher:
+
+    def __init__(self, registry, interval=5.0):
+        self.registry = registry
+        self.interval = interval
+        self.condition = threading.Condition()
+        self.sequence = 0                       # Incremented whenever any dataset's version changes
+        self.versions = self._read_versions()   # dataset id -> version of its source file
+        self.thread = None
+
+    def _read_versions(self):
+        versions = {}
+        for dataset_id in self.registry.dataset_ids():
+            try:
+                versions[dataset_id] = self.registry.source_version(dataset_id)[0]
+            except OSError:
+                versions[dataset_id] = None  # The source file is missing (or being replaced)
+        return versions
+
+    def start(self):
+        # The thread is only started when the first browser connects (a process with no streams never polls)
+        with self.condition:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='BundleWatcher', daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            versions = self._read_versions()
+            if versions == self.versions:
+                continue
+            # Reload the changed bundles before telling the browsers, so that their requests see the new data
+            for dataset_id, version in versions.items():
+                if version is not None and version != self.versions.get(dataset_id):
+                    self.registry.refresh(dataset_id)
+            with self.condition:
+                self.versions = versions
+                self.sequence += 1
+                self.condition.notify_all()
+
+    def current(self):
+        with self.condition:
+            return self.sequence, dict(self.versions)
+
+    def wait_for_change(self, sequence, timeout):
+        # Block until the versions change from those seen at "sequence" (or until the timeout)
+        with self.condition:
+            self.condition.wait_for(lambda: self.sequence != sequence, timeout)
+            return self.sequence, dict(self.versions)
+
+# -------------------------------------------------------------------------------
+# Define the function that registers the event stream on a Flask server
+# -------------------------------------------------------------------------------
+
+def format_event(sequence, versions):
+    return f"id: {sequence}\nevent: bundle-version\ndata: {json.dumps(versions)}\n\n"
+
+def register_live_updates(server, registry, interval=5.0):
+    watcher = BundleWatcher(registry, interval)
+
+    @server.route('/events')
+    def events():
+        watcher.start()
+
+        def stream():
+            sequence, versions = watcher.current()
+            # The first event tells the browser the current versions (its baseline)
+            yield f"retry: {RETRY_MILLISECONDS}\n" + format_event(sequence, versions)
+            deadline = time.time() + MAX_STREAM_SECONDS
+            while time.time() < deadline:
+                new_sequence, versions = watcher.wait_for_change(sequence, KEEPALIVE_SECONDS)
+                if new_sequence == sequence:
+                    yield ": keep-alive\n\n"
+                else:
+                    sequence = new_sequence
+                    yield format_event(sequence, versions)
+
+        return flask.Response(stream(), mimetype='text/event-stream',
+                              headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+    return watcher
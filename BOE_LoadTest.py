@@ -0,0 +1,422 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+# -------------------------------------------------------------------------------
+# Import additional Python functionality / various libraries
+# -------------------------------------------------------------------------------
+
+import argparse
+import concurrent.futures
+import json
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import numpy as np
+
+"""
+Local load-testing harness for the dashboard ("BOE_Dash.py").
+
+The harness replays realistic analyst interaction sequences against the Dash callback endpoint \
+("/_dash-update-component") of a locally running server, and reports the throughput and latency \
+percentiles of every callback. Everything runs offline against 127.0.0.1: the callback graph and the \
+initial input values are read from the server itself ("/_dash-dependencies" and "/_dash-layout"), so \
+the harness stays in step with the dashboard as callbacks are added or changed.
+
+Example (start a local gunicorn with 4 workers, then simulate 20 concurrent analysts for 60 seconds):
+    python BOE_LoadTest.py --start-server --workers 4 --users 20 --duration 60
+"""
+
+# -------------------------------------------------------------------------------
+# Define helper functions that talk to the locally running Dash server
+# -------------------------------------------------------------------------------
+
+def http_request(url, payload=None, timeout=60, headers=None):
+    # Send a GET request (or a POST request, if a JSON payload is provided) and return the decoded JSON response
+    data = None
+    headers = dict(headers or {})
+    if payload is not None:
+        data = json.dumps(payload).encode('utf-8')
+        headers['Content-Type'] = 'application/json'
+    request = urllib.request.Request(url, data=data, headers=headers)
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        body = response.read()
+    return json.loads(body) if body else None
+
+def http_get_text(url, timeout=60):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return response.read().decode('utf-8')
+
+def wait_for_server(base_url, timeout=60):
+    # Poll the server until it responds (or give up after "timeout" seconds)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            http_request(f'{base_url}/_dash-dependencies', timeout=5)
+            return True
+        except (urllib.error.URLError, ConnectionError, OSError):
+            time.sleep(0.5)
+    return False
+
+def start_gunicorn(host, port, workers, threads):
+    # Start a local gunicorn serving the dashboard's Flask server ("server = app.server" in BOE_Dash.py)
+    command = [sys.executable, '-m', 'gunicorn',
+               '--workers', str(workers),
+               '--threads', str(threads),
+               '--bind', f'{host}:{port}',
+               '--log-level', 'warning',
+               'BOE_Dash:server']
+    print('Starting local server:', ' '.join(command))
+    return subprocess.Popen(command)
+
+def find_layout_components(layout, found=None):
+    # Walk the serialised Dash layout and collect the props of every component that has an "id"
+    if found is None:
+        found = {}
+    if isinstance(layout, list):
+        for child in layout:
+            find_layout_components(child, found)
+    elif isinstance(layout, dict):
+        props = layout.get('props', {})
+        if 'id' in props:
+            found[props['id']] = props
+        find_layout_components(props.get('children'), found)
+        # Components nested inside other props (e.g. a Graph passed as a Div's only child) are also walked
+        for value in props.values():
+            if isinstance(value, dict) and 'props' in value:
+                find_layout_components(value, found)
+    return found
+
+def split_output(output):
+    # Dash encodes multi-output callbacks as "..id1.prop1...id2.prop2.."
+    if output.startswith('..'):
+        return [item for item in output[2:-2].split('...')]
+    return [output]
+
+# -------------------------------------------------------------------------------
+# Define the callback graph, as reported by the server
+# -------------------------------------------------------------------------------
+
+class CallbackGraph:
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.callbacks = [dep for dep in http_request(f'{base_url}/_dash-dependencies')
+                          if not dep.get('clientside_function')]
+        self.components = find_layout_components(http_request(f'{base_url}/_dash-layout'))
+        # Newer versions of Dash sign background callback handles against a per-page token, found in the page's config
+        config = re.search(r'<script id="_dash-config" type="application/json">(.*?)</script>',
+                           http_get_text(f'{base_url}/'), re.DOTALL)
+        self.end_id = json.loads(config.group(1)).get('end_id') if config else None
+
+    def initial_values(self):
+        # The initial value of every callback input/state, exactly as the browser would first send it
+        values = {}
+        for dep in self.callbacks:
+            for item in dep['inputs'] + dep['state']:
+                props = self.components.get(item['id'], {})
+                values[(item['id'], item['property'])] = props.get(item['property'])
+        return values
+
+    def options(self, component_id):
+        # The values a user could pick from a dropdown / radio / checklist component
+        options = self.components.get(component_id, {}).get('options') or []
+        return [option['value'] if isinstance(option, dict) else option for option in options]
+
+    def triggered_by(self, changed):
+        # The callbacks the browser fires when the given (component id, property) inputs change
+        return [dep for dep in self.callbacks
+                if any((item['id'], item['property']) in changed for item in dep['inputs'])]
+
+    @staticmethod
+    def outputs_of(dep):
+        # The (component id, property) pairs a callback writes to ("figure@<hash>" marks an allow_duplicate output)
+        return {(component_id, prop.split('@')[0])
+                for component_id, prop in (output.rsplit('.', 1) for output in split_output(dep['output']))}
+
+    def build_payload(self, dep, values, changed):
+        # Build the JSON body that dash-renderer POSTs to "/_dash-update-component"
+        outputs = []
+        for output in split_output(dep['output']):
+            component_id, prop = output.rsplit('.', 1)
+            outputs.append({'id': component_id, 'property': prop})
+        return {
+            'output': dep['output'],
+            'outputs': outputs if dep['output'].startswith('..') else outputs[0],
+            'inputs': [dict(item, value=values.get((item['id'], item['property']))) for item in dep['inputs']],
+            'state': [dict(item, value=values.get((item['id'], item['property']))) for item in dep['state']],
+            'changedPropIds': [f'{component_id}.{prop}' for component_id, prop in changed],
+            }
+
+# -------------------------------------------------------------------------------
+# Define realistic analyst interaction sequences
+# -------------------------------------------------------------------------------
+
+"""
+Each sequence is a list of "steps"; each step is a dictionary of {(component id, property): new value}.
+The sequences mirror how analysts actually use the dashboard: flipping the periodicity radio buttons, \
+sweeping the start / end year dropdowns one year at a time, and toggling household component checkboxes.
+"""
+
+def sequence_flip_periodicity(graph, rng):
+    options = graph.options('radio-display') or ['prior_q', 'prior_y']
+    return [{('radio-display', 'value'): options[i % len(options)]} for i in range(1, 2 * len(options) + 1)]
+
+def sequence_sweep_years(graph, rng):
+    years = sorted(int(year) for year in graph.options('start-year-dropdown'))
+    if not years:
+        return []
+    steps = []
+    start = rng.choice(years[:max(1, len(years) // 2)])
+    end = years[-1]
+    # Sweep the start year forwards, one year at a time
+    for year in range(start, min(start + 10, end) + 1):
+        steps.append({('start-year-dropdown', 'value'): year})
+    # ...then pull the end year backwards, one year at a time
+    for year in range(end, max(end - 5, start) - 1, -1):
+        steps.append({('end-year-dropdown', 'value'): year})
+    return steps
+
+def sequence_toggle_households(graph, rng):
+    options = graph.options('component-checkboxes')
+    selected = list(options)
+    steps = []
+    for component in rng.sample(options, len(options)):
+        # Untick a component, then tick it again
+        selected = [item for item in selected if item != component]
+        steps.append({('component-checkboxes', 'value'): list(selected)})
+        selected = [item for item in options if item in selected or item == component]
+        steps.append({('component-checkboxes', 'value'): list(selected)})
+    return steps
+
+SEQUENCES = {
+    'flip-periodicity': sequence_flip_periodicity,
+    'sweep-years': sequence_sweep_years,
+    'toggle-households': sequence_toggle_households,
+    }
+
+# -------------------------------------------------------------------------------
+# Define the simulated analysts and the collection of results
+# -------------------------------------------------------------------------------
+
+class Results:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}     # callback output -> list of latencies (seconds)
+        self.errors = {}        # callback output -> number of failed requests
+        self.interactions = {}  # interaction (page load / sequence) -> list of wall times (seconds)
+
+    def record(self, output, latency, ok):
+        with self.lock:
+            if ok:
+                self.latencies.setdefault(output, []).append(latency)
+            else:
+                self.errors[output] = self.errors.get(output, 0) + 1
+
+    def record_interaction(self, name, wall_time):
+        with self.lock:
+            self.interactions.setdefault(name, []).append(wall_time)
+
+def request_callback(graph, payload, timeout, poll_interval=0.1, headers=None):
+    url = f'{graph.base_url}/_dash-update-component'
+    page_query = {'endId': graph.end_id} if graph.end_id else {}
+    response = http_request(f'{url}?{urllib.parse.urlencode(page_query)}', payload, timeout=timeout, headers=headers)
+    # A background callback (see "heavy_callback" in BOE_Dash.py) first returns a handle to its job;
+    # the browser then polls with that handle until the result is ready
+    if isinstance(response, dict) and 'cacheKey' in response:
+        query = dict(page_query, cacheKey=response['cacheKey'], job=response['job'])
+        deadline = time.time() + timeout
+        while isinstance(response, dict) and 'response' not in response:
+            if time.time() >= deadline:
+                raise TimeoutError('background callback did not finish in time')
+            time.sleep(poll_interval)
+            response = http_request(f'{url}?{urllib.parse.urlencode(query)}', payload, timeout=timeout, headers=headers)
+    return response
+
+def fire_callback(graph, dep, values, changed, results, timeout, headers=None):
+    # Fire one callback and return the {(component id, property): value} updates in its response
+    payload = graph.build_payload(dep, values, changed)
+    started = time.perf_counter()
+    try:
+        response = request_callback(graph, payload, timeout, headers=headers)
+        ok = True
+    except Exception:
+        response, ok = None, False
+    results.record(dep['output'], time.perf_counter() - started, ok)
+    updates = {}
+    if isinstance(response, dict):
+        for component_id, props in (response.get('response') or {}).items():
+            for prop, value in props.items():
+                updates[(component_id, prop)] = value
+    return updates
+
+"""
+Like dash-renderer, each interaction fires all of the callbacks its changed inputs trigger at once, over \
+the analyst's own small pool of connections (a browser keeps a handful per host), and then follows the \
+chain: the outputs in each response are applied to the page state and fire the callbacks that depend on \
+them. A callback whose inputs are also written by another callback in the same round is held back until \
+that callback has answered, so it is fired once, with the updated values, as the browser would.
+"""
+
+browser_connections = 6  # concurrent requests per analyst
+max_chain_rounds = 10    # guards against callback cycles
+
+def fire_callbacks(graph, values, changed, results, timeout, pool, page_load=False, headers=None):
+    changed = set(changed)
+    pending = [dep for dep in graph.triggered_by(changed)
+               if not (page_load and dep.get('prevent_initial_call'))]
+    for _ in range(max_chain_rounds):
+        if not pending:
+            break
+        # Hold back the callbacks that wait on another pending callback's outputs
+        written = [(dep, graph.outputs_of(dep)) for dep in pending]
+        ready = [dep for dep in pending
+                 if not any((item['id'], item['property']) in outputs
+                            for other, outputs in written if other is not dep for item in dep['inputs'])]
+        ready = ready or pending
+        waiting = [dep for dep in pending if dep not in ready]
+        snapshot = dict(values)
+        futures = [pool.submit(fire_callback, graph, dep, snapshot, changed, results, timeout, headers) for dep in ready]
+        updated = set()
+        for future in futures:
+            for key, value in future.result().items():
+                # A partial update (dash.Patch) changes the property without sending its full new value
+                if not (isinstance(value, dict) and '__dash_patch_update' in value):
+                    values[key] = value
+                updated.add(key)
+        changed |= updated
+        fired = {dep['output'] for dep in ready}
+        pending = waiting + [dep for dep in graph.triggered_by(updated)
+                             if dep['output'] not in fired and dep not in waiting]
+
+def simulate_analyst(graph, results, deadline, seed, think_time, timeout):
+    rng = random.Random(seed)
+    values = graph.initial_values()
+    # Each analyst is a separate browser session (see SESSION_COOKIE in "BOE_Prefetch.py")
+    headers = {'Cookie': f'boe_session=analyst-{seed}'}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=browser_connections) as pool:
+        # Page load: the browser fires every callback once with the initial values
+        started = time.perf_counter()
+        fire_callbacks(graph, values, set(values), results, timeout, pool, page_load=True, headers=headers)
+        results.record_interaction('page load', time.perf_counter() - started)
+        while time.time() < deadline:
+            name = rng.choice(sorted(SEQUENCES))
+            for step in SEQUENCES[name](graph, rng):
+                if time.time() >= deadline:
+                    return
+                values.update(step)
+                started = time.perf_counter()
+                fire_callbacks(graph, values, set(step), results, timeout, pool, headers=headers)
+                results.record_interaction(name, time.perf_counter() - started)
+                if think_time:
+                    time.sleep(rng.uniform(0, 2 * think_time))
+
+# -------------------------------------------------------------------------------
+# Define the report of throughput and latency percentiles per callback
+# -------------------------------------------------------------------------------
+
+def print_report(results, elapsed, users):
+    print(f"\nLoad test: {users} concurrent analysts for {elapsed:.1f}s")
+    header = f"{'Callback output':<45}{'requests':>10}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+    print(header)
+    print('-' * len(header))
+    all_latencies = []
+    outputs = sorted(set(results.latencies) | set(results.errors))
+    for output in outputs:
+        latencies = np.array(results.latencies.get(output, [])) * 1000
+        all_latencies.extend(latencies)
+        errors = results.errors.get(output, 0)
+        print(format_row(output, latencies, errors, elapsed))
+    print('-' * len(header))
+    print(format_row('ALL CALLBACKS', np.array(all_latencies), sum(results.errors.values()), elapsed))
+    # The wall time of each interaction: from the user's change until the last chained callback has answered
+    print(f"\n{'Interaction (wall time)':<45}{'count':>10}{'':>8}{'per s':>9}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    print('-' * len(header))
+    for name in sorted(results.interactions):
+        print(format_row(name, np.array(results.interactions[name]) * 1000, 0, elapsed))
+
+def format_row(label, latencies, errors, elapsed):
+    if len(latencies):
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+        worst = latencies.max()
+    else:
+        p50 = p90 = p99 = worst = float('nan')
+    return (f"{label[:44]:<45}{len(latencies):>10}{errors:>8}{len(latencies) / elapsed:>9.1f}"
+            f"{p50:>9.1f}{p90:>9.1f}{p99:>9.1f}{worst:>9.1f}")
+
+def print_prefetch_report(base_url):
+    # When the server prefetches likely next states (see "BOE_Prefetch.py"), report how often they were used.
+    # (The statistics are per server process: with several gunicorn workers, this is one worker's share.)
+    try:
+        stats = http_request(f'{base_url}/prefetch-stats', timeout=5)
+    except (urllib.error.URLError, ConnectionError, OSError, ValueError):
+        return
+    if not stats or not stats.get('enabled'):
+        return
+    print(f"\nPrefetch: {stats['hits']} of {stats['requests']} cached callbacks served from the cache "
+          f"(hit rate {stats['hit_rate'] or 0:.0%}); {stats['prefetched']} states prefetched, "
+          f"{stats['prefetch_hits']} of them used, {stats['prefetch_cpu_seconds']:.1f}s prefetch CPU")
+    for name, counts in sorted(stats['callbacks'].items()):
+        print(f"    {name:<30}{counts['hits']:>6} / {counts['requests']:<6} hit rate {counts['hit_rate']:.0%}")
+
+# -------------------------------------------------------------------------------
+# Command-line entry point
+# -------------------------------------------------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay analyst interactions against a local BOE_Dash server.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8050)
+    parser.add_argument('--users', type=int, default=10, help='number of concurrent simulated analysts')
+    parser.add_argument('--duration', type=float, default=30, help='length of the test, in seconds')
+    parser.add_argument('--think-time', type=float, default=0.0, help='mean pause between interactions, in seconds')
+    parser.add_argument('--timeout', type=float, default=60, help='per-request timeout, in seconds')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--start-server', action='store_true', help='start (and stop) a local gunicorn for the test')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes (with --start-server)')
+    parser.add_argument('--threads', type=int, default=1, help='gunicorn threads per worker (with --start-server)')
+    args = parser.parse_args(argv)
+
+    base_url = f'http://{args.host}:{args.port}'
+    server = start_gunicorn(args.host, args.port, args.workers, args.threads) if args.start_server else None
+
+    try:
+        if not wait_for_server(base_url):
+            print(f"Error: no dashboard responding at {base_url}")
+            return 1
+
+        graph = CallbackGraph(base_url)
+        print(f"Found {len(graph.callbacks)} callbacks at {base_url}")
+
+        results = Results()
+        started = time.time()
+        deadline = started + args.duration
+        analysts = [threading.Thread(target=simulate_analyst,
+                                     args=(graph, results, deadline, args.seed + i, args.think_time, args.timeout))
+                    for i in range(args.users)]
+        for analyst in analysts:
+            analyst.start()
+        for analyst in analysts:
+            analyst.join()
+
+        print_report(results, time.time() - started, args.users)
+        print_prefetch_report(base_url)
+        return 0
+
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+# -------------------------------------------------------------------------------
+# Import additional Python functionality / various libraries
+# -------------------------------------------------------------------------------
+
+import functools
+import inspect
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import flask
+
+"""
+Speculative prefetching of the dashboard states an analyst is likely to ask for next.
+
+Analysts tend to move through the dashboard one small step at a time: sweeping the start / end year one year \
+at a time, or flipping between the two periodicities or the two plot types. After a callback has served a \
+request, the prefetcher renders the most likely next states (its "neighbours") on idle background threads, \
+and keeps the results in a small callback cache. If the analyst then asks for one of those states, the figure \
+is returned straight from the cache.
+
+The prefetcher is opt-in (BOE_PREFETCH=1), and is kept on a leash:
+    - it only starts a prefetch when no request (of any kind, counted around every request the server handles) is \
+      being served by this process ("idle" threads);
+    - its CPU time is limited to a fraction of one CPU (BOE_PREFETCH_CPU_BUDGET, default 0.5), measured per task;
+    - predictions made for an earlier request are dropped once a newer request has arrived from the same browser \
+      session (identified by the SESSION_COOKIE cookie), so one analyst never cancels another's predictions;
+    - the cache holds at most BOE_PREFETCH_CACHE_SIZE figures (default 512), least recently used evicted first.
+Cache keys include the dataset's version, so a new bundle never serves stale figures.
+The hit rate (and what the prefetcher has cost) is reported at /prefetch-stats (per server process).
+"""
+
+# The cookie that identifies a browser session (set on the first response to a browser without one)
+SESSION_COOKIE = 'boe_session'
+
+# Requests to these paths are long-lived streams or the prefetcher's own report, so they do not count as "busy"
+IGNORED_PATHS = ('/events', '/prefetch-stats')
+
+# A prefetch queued by a request waits (at most this long) for that request, and any others, to finish
+IDLE_WAIT_SECONDS = 1.0
+
+# The number of (session, callback) generations remembered; the least recently active sessions are forgotten first
+MAX_GENERATIONS = 4096
+
+# Unused CPU budget accumulates for at most this many seconds (so a long idle spell does not allow a long burst)
+MAX_BUDGET_SECONDS = 2.0
+
+# -------------------------------------------------------------------------------
+# Define the prefetcher
+# -------------------------------------------------------------------------------
+
+class Prefetcher:
+
+    def __init__(self, registry, enabled=False, workers=1, cpu_budget=0.5, cache_size=512):
+        self.registry = registry
+        self.enabled = enabled
+        self.cpu_budget = cpu_budget    # Fraction of one CPU that prefetching may use
+        self.cache_size = cache_size
+        self.cache = OrderedDict()      # key -> [figure, prefetched?, used since prefetched?], least recently used first
+        self.lock = threading.Lock()
+        self.idle = threading.Condition(self.lock)  # Notified whenever the last request in flight finishes
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='Prefetch') if enabled else None
+        self.in_flight = 0              # Requests currently being served by this process (see "register_routes")
+        self.generation = OrderedDict() # (session, callback name) -> requests served (to spot stale predictions)
+        self.budget = MAX_BUDGET_SECONDS * cpu_budget
+        self.budget_updated = time.monotonic()
+        self.stats = {'requests': 0, 'hits': 0, 'prefetch_hits': 0, 'prefetched': 0, 'prefetch_cpu_seconds': 0.0,
+                      'prefetched_unused_evicted': 0, 'skipped_busy': 0, 'skipped_budget': 0, 'skipped_stale': 0}
+        self.callback_stats = {}        # callback name -> {'requests': n, 'hits': n}
+
+    @classmethod
+    def from_environment(cls, registry, environ):
+        return cls(registry,
+                   enabled=bool(environ.get('BOE_PREFETCH')),
+                   workers=int(environ.get('BOE_PREFETCH_WORKERS', 1)),
+                   cpu_budget=float(environ.get('BOE_PREFETCH_CPU_BUDGET', 0.5)),
+                   cache_size=int(environ.get('BOE_PREFETCH_CACHE_SIZE', 512)))
+
+    # ---------------------------------------------------------------------------
+    # The callback cache
+    # ---------------------------------------------------------------------------
+
+    def _lookup(self, key):
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry is None:
+                return None
+            self.cache.move_to_end(key)
+            if entry[1] and not entry[2]:
+                entry[2] = True
+                self.stats['prefetch_hits'] += 1
+            return entry[0]
+
+    def _store(self, key, figure, prefetched):
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return
+            self.cache[key] = [figure, prefetched, False]
+            while len(self.cache) > self.cache_size:
+                _, evicted = self.cache.popitem(last=False)
+                if evicted[1] and not evicted[2]:
+                    self.stats['prefetched_unused_evicted'] += 1
+
+    # ---------------------------------------------------------------------------
+    # The CPU budget
+    # ---------------------------------------------------------------------------
+
+    def _take_budget(self):
+        # Top up the budget for the time that has passed; a prefetch may start while some budget remains
+        with self.lock:
+            now = time.monotonic()
+            self.budget = min(MAX_BUDGET_SECONDS * self.cpu_budget,
+                              self.budget + (now - self.budget_updated) * self.cpu_budget)
+            self.budget_updated = now
+            return self.budget > 0
+
+    def _spend_budget(self, cpu_seconds):
+        with self.lock:
+            self.budget -= cpu_seconds
+            self.stats['prefetch_cpu_seconds'] += cpu_seconds
+
+    # ---------------------------------------------------------------------------
+    # Wrapping the dashboard's callback functions
+    # ---------------------------------------------------------------------------
+
+    def cached(self, neighbours, ignore=('bundle_update', 'set_progress'), bypass=None):
+        """
+        Decorate a callback function so that its figures are cached, and its neighbouring states prefetched.
+        "neighbours(arguments, dataset)" returns the likely next states: a list of {argument name: new value}.
+        Arguments named in "ignore" are not part of the cache key. When "bypass(arguments)" is True, the call
+        goes straight to the function (e.g. when it may return no_update).
+        When the prefetcher is disabled, the function is returned unchanged; otherwise the undecorated function
+        remains available as "wrapper.uncached".
+        """
+        def decorate(function):
+            if not self.enabled:
+                return function
+            signature = inspect.signature(function)
+            name = function.__name__
+
+            def cache_key(arguments):
+                dataset = self.registry.get(arguments.get('dataset_id'))
+                values = {key: value for key, value in arguments.items() if key not in ignore}
+                return (name, dataset.id, dataset.version, json.dumps(values, sort_keys=True, default=str)), dataset
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                arguments = dict(bound.arguments)
+                if bypass is not None and bypass(arguments):
+                    return function(*args, **kwargs)
+
+                key, dataset = cache_key(arguments)
+                generation_key = (current_session(), name)
+                with self.lock:
+                    self.generation[generation_key] = generation = self.generation.get(generation_key, 0) + 1
+                    self.generation.move_to_end(generation_key)
+                    if len(self.generation) > MAX_GENERATIONS:
+                        self.generation.popitem(last=False)
+                    self.stats['requests'] += 1
+                    self.callback_stats.setdefault(name, {'requests': 0, 'hits': 0})['requests'] += 1
+                figure = self._lookup(key)
+                if figure is None:
+                    figure = function(*args, **kwargs)
+                    self._store(key, figure, prefetched=False)
+                else:
+                    with self.lock:
+                        self.stats['hits'] += 1
+                        self.callback_stats[name]['hits'] += 1
+
+                # Queue the likely next states (they only run once this process is idle)
+                for changes in neighbours(arguments, dataset):
+                    neighbour = dict(arguments, **changes)
+                    for argument in ignore:
+                        neighbour.pop(argument, None)
+                    self.pool.submit(self._prefetch, function, name, generation_key, generation, neighbour)
+                return figure
+
+            wrapper.uncached = function  # e.g. for callbacks run as background jobs, in another process
+            return wrapper
+        return decorate
+
+    def _prefetch(self, function, name, generation_key, generation, arguments):
+        with self.idle:
+            stale = lambda: self.generation.get(generation_key) != generation
+            self.idle.wait_for(lambda: self.in_flight == 0 or stale(), IDLE_WAIT_SECONDS)
+            if stale():
+                self.stats['skipped_stale'] += 1  # a newer request has arrived since this prediction was made
+                return
+            if self.in_flight:
+                self.stats['skipped_busy'] += 1
+                return
+        if not self._take_budget():
+            with self.lock:
+                self.stats['skipped_budget'] += 1
+            return
+
+        try:
+            dataset = self.registry.get(arguments.get('dataset_id'))
+            key = (name, dataset.id, dataset.version, json.dumps(arguments, sort_keys=True, default=str))
+            with self.lock:
+                if key in self.cache:
+                    return
+            started = time.thread_time()
+            figure = function(**arguments)
+            self._spend_budget(time.thread_time() - started)
+            self._store(key, figure, prefetched=True)
+            with self.lock:
+                self.stats['prefetched'] += 1
+        except Exception as e:
+            print(f"Error: prefetching {name} failed ({e}).")
+
+    # ---------------------------------------------------------------------------
+    # Reporting
+    # ---------------------------------------------------------------------------
+
+    def report(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['enabled'] = self.enabled
+            stats['hit_rate'] = stats['hits'] / stats['requests'] if stats['requests'] else None
+            # The share of prefetched figures that were actually used (so far)
+            stats['prefetch_precision'] = stats['prefetch_hits'] / stats['prefetched'] if stats['prefetched'] else None
+            stats['cache_entries'] = len(self.cache)
+            stats['callbacks'] = {name: dict(counts, hit_rate=counts['hits'] / counts['requests'])
+                                  for name, counts in self.callback_stats.items()}
+        return stats
+
+    def register_routes(self, server):
+        """
+        Register the /prefetch-stats route and (when enabled) count the requests in flight around every request \
+        the server handles - callbacks, data API routes and page loads alike - so that prefetching only runs when \
+        this process is idle. Browsers without a session cookie are given one.
+        """
+        @server.route('/prefetch-stats')
+        def prefetch_stats():
+            return flask.Response(json.dumps(self.report()), mimetype='application/json')
+
+        if not self.enabled:
+            return
+
+        @server.before_request
+        def request_started():
+            if flask.request.path not in IGNORED_PATHS:
+                flask.g.prefetch_counted = True
+                with self.lock:
+                    self.in_flight += 1
+
+        @server.after_request
+        def set_session_cookie(response):
+            if SESSION_COOKIE not in flask.request.cookies:
+                response.set_cookie(SESSION_COOKIE, uuid.uuid4().hex, httponly=True, samesite='Lax')
+            return response
+
+        @server.teardown_request
+        def request_finished(exception=None):
+            # (Called even when the request failed, so the count never drifts)
+            if flask.g.pop('prefetch_counted', False):
+                with self.idle:
+                    self.in_flight -= 1
+                    if self.in_flight == 0:
+                        self.idle.notify_all()
+
+# -------------------------------------------------------------------------------
+# Define a helper function that identifies the browser session of the current request
+# -------------------------------------------------------------------------------
+
+def current_session():
+    # The session cookie (or, until the browser has one, its address); None outside of a request
+    if not flask.has_request_context():
+        return None
+    return flask.request.cookies.get(SESSION_COOKIE) or flask.request.remote_addr
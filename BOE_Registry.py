@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+# -------------------------------------------------------------------------------
+# Import additional Python functionality / various libraries
+# -------------------------------------------------------------------------------
+
+import json
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+import numpy as np
+
+# Import functions from our own BOE_Utilities module
+from BOE_Utilities import complete_data_bundle
+
+# The column_mapping that "data_bundle.pickle" was created with (see "BOE_Data.py")
+from BOE_Data import column_mapping
+
+"""
+A registry of datasets, so that one dashboard server can host many data bundles.
+
+Each dataset is a bundle produced by the BOE_Data pipeline, with its own column_mapping. A dataset is either:
+    - a pickled bundle, already saved by "BOE_Data.py"              e.g. {"bundle": "data_bundle.pickle"}
+    - a source Excel file plus its column_mapping, which is run through the BOE_Data pipeline on first use
+                                                                     e.g. {"file_name": "...", "column_mapping": {...}}
+
+A pickled bundle saved by an older "BOE_Data.py" does not record its column_mapping; one can be given alongside \
+the bundle (as for a source file), so that the dashboard's series search also covers the source column names.
+
+Bundles are loaded lazily, the first time a dataset is used. The registry keeps track of how much memory the \
+loaded bundles occupy; when a memory budget is exceeded, the least recently used bundles are evicted \
+(and simply re-loaded, if they are needed again).
+
+The datasets can be listed in a JSON file, whose path is given by the BOE_DATASETS environment variable:
+    {"uk": {"label": "UK GDP", "bundle": "data_bundle.pickle"},
+     "uk_alt": {"label": "UK GDP (alternative mapping)", "file_name": "Dashboard dataset.xlsx", "column_mapping": {...}}}
+The memory budget (in MB) is given by the BOE_DATASET_MEMORY_MB environment variable.
+
+When a dataset's source file is re-written (e.g. "BOE_Data.py" runs for a new release), the dataset is reloaded \
+the next time it is used, in every server process.
+"""
+
+# The dataset that is served when no configuration file is given (the original single-bundle dashboard)
+DEFAULT_DATASETS = {'uk': {'label': 'UK GDP', 'bundle': 'data_bundle.pickle', 'column_mapping': column_mapping}}
+
+DEFAULT_MEMORY_BUDGET_MB = 512
+
+# A loaded dataset's source file is checked (a cheap os.stat) at most this often, so that every server process picks up
+# a new version of a bundle on its own (gunicorn's workers do not share the bundles they have loaded)
+SOURCE_CHECK_SECONDS = 1.0
+
+# The changes recorded for the most recent reloads of each dataset (older ones are forgotten)
+MAX_RECORDED_CHANGES = 10
+
+# -------------------------------------------------------------------------------
+# Define a helper function that estimates the memory occupied by a bundle
+# -------------------------------------------------------------------------------
+
+def bundle_nbytes(value):
+    # Add up the memory of every dataframe / array in the bundle (including those nested inside dictionaries)
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(np.sum(value.memory_usage(deep=True)))
+    if isinstance(value, pd.Index):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(bundle_nbytes(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(bundle_nbytes(item) for item in value)
+    return 0
+
+# -------------------------------------------------------------------------------
+# Define helper functions that find which parts of a bundle have changed between two versions
+# -------------------------------------------------------------------------------
+
+def same_value(old, new):
+    if type(old) is not type(new):
+        return False
+    if isinstance(old, (pd.DataFrame, pd.Series, pd.Index)):
+        return old.equals(new)
+    if isinstance(old, np.ndarray):
+        return old.shape == new.shape and np.array_equal(old, new, equal_nan=old.dtype.kind == 'f')
+    if isinstance(old, dict):
+        return old.keys() == new.keys() and all(same_value(old[key], new[key]) for key in old)
+    if isinstance(old, (list, tuple)):
+        return len(old) == len(new) and all(same_value(a, b) for a, b in zip(old, new))
+    return old == new
+
+def bundle_changes(old_bundle, new_bundle):
+    # The keys of the bundle whose values differ between the two versions (including keys added or removed)
+    keys = list(dict.fromkeys(list(old_bundle) + list(new_bundle)))
+    return [key for key in keys if key not in old_bundle or key not in new_bundle
+            or not same_value(old_bundle[key], new_bundle[key])]
+
+# -------------------------------------------------------------------------------
+# Define a loaded dataset
+# -------------------------------------------------------------------------------
+
+class Dataset:
+
+    def __init__(self, dataset_id, label, bundle, version, last_modified):
+        self.id = dataset_id
+        self.label = label
+        self.bundle = bundle
+        self.version = version              # Changes whenever the underlying bundle changes
+        self.last_modified = last_modified  # Unix timestamp of the underlying bundle (or source file)
+        self.nbytes = bundle_nbytes(bundle)
+        self.cache = {}                     # Objects derived from this bundle (e.g. figures), evicted along with it
+        self.checked = time.monotonic()     # When the source file was last checked for a new version
+
+    def __getitem__(self, key):
+        return self.bundle[key]
+
+# -------------------------------------------------------------------------------
+# Define the registry
+# -------------------------------------------------------------------------------
+
+class DatasetRegistry:
+
+    def __init__(self, datasets, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB):
+        self.specs = OrderedDict(datasets)     # dataset id -> specification (see above)
+        self.memory_budget = memory_budget_mb * 1024 ** 2
+        self.loaded = OrderedDict()            # dataset id -> Dataset, least recently used first
+        self.lock = threading.Lock()
+        self.load_locks = {dataset_id: threading.Lock() for dataset_id in self.specs}
+        self.changes = OrderedDict()           # (dataset id, old version) -> (new version, keys of the bundle that changed)
+
+    @classmethod
+    def from_environment(cls):
+        config_file = os.environ.get('BOE_DATASETS')
+        if config_file:
+            with open(config_file) as f:
+                datasets = json.load(f, object_pairs_hook=OrderedDict)
+        else:
+            datasets = DEFAULT_DATASETS
+        memory_budget_mb = float(os.environ.get('BOE_DATASET_MEMORY_MB', DEFAULT_MEMORY_BUDGET_MB))
+        return cls(datasets, memory_budget_mb)
+
+    # ---------------------------------------------------------------------------
+    # Describing the datasets
+    # ---------------------------------------------------------------------------
+
+    def dataset_ids(self):
+        return list(self.specs)
+
+    @property
+    def default_id(self):
+        return next(iter(self.specs))
+
+    def label(self, dataset_id):
+        return self.specs[dataset_id].get('label', dataset_id)
+
+    def source_path(self, dataset_id):
+        spec = self.specs[dataset_id]
+        return spec['bundle'] if 'bundle' in spec else spec['file_name']
+
+    def source_version(self, dataset_id):
+        # The version of the dataset's source file on disk (it changes whenever the file is re-written)
+        stat = os.stat(self.source_path(dataset_id))
+        return f'{stat.st_mtime_ns:x}-{stat.st_size:x}', stat.st_mtime
+
+    # ---------------------------------------------------------------------------
+    # Loading and evicting bundles
+    # ---------------------------------------------------------------------------
+
+    def _load(self, dataset_id):
+        spec = self.specs[dataset_id]
+        version, last_modified = self.source_version(dataset_id)
+
+        if 'bundle' in spec:
+            with open(spec['bundle'], 'rb') as f:
+                bundle = pickle.load(f)
+        else:
+            # Run the BOE_Data pipeline on the source file, with this dataset's own column_mapping
+            from BOE_Data import create_data_bundle
+            bundle = create_data_bundle(spec['file_name'], spec['column_mapping'])
+
+        print(f"Dataset '{dataset_id}' loaded successfully.")
+        bundle = complete_data_bundle(bundle, column_mapping=spec.get('column_mapping'))
+        return Dataset(dataset_id, self.label(dataset_id), bundle, version, last_modified)
+
+    def get(self, dataset_id=None):
+        dataset_id = dataset_id or self.default_id
+        if dataset_id not in self.specs:
+            raise KeyError(f"Unknown dataset: {dataset_id}")
+
+        with self.lock:
+            dataset = self.loaded.get(dataset_id)
+            if dataset is not None:
+                self.loaded.move_to_end(dataset_id)
+                # Every so often, check whether the source file has changed since the dataset was loaded
+                check_source = time.monotonic() - dataset.checked >= SOURCE_CHECK_SECONDS
+                if check_source:
+                    dataset.checked = time.monotonic()
+        if dataset is not None:
+            if check_source and self.refresh(dataset_id):
+                with self.lock:
+                    dataset = self.loaded.get(dataset_id, dataset)
+            return dataset
+
+        # Load outside the registry lock (so that other datasets stay available), but only once per dataset
+        with self.load_locks[dataset_id]:
+            with self.lock:
+                dataset = self.loaded.get(dataset_id)
+            if dataset is None:
+                dataset = self._load(dataset_id)
+
+        with self.lock:
+            self.loaded[dataset_id] = dataset
+            self.loaded.move_to_end(dataset_id)
+            self._evict(keep=dataset_id)
+        return dataset
+
+    def refresh(self, dataset_id):
+        """
+        Reload a loaded dataset if its source file has changed since it was loaded (e.g. a new vintage has landed), \
+        and record which keys of the bundle changed. Returns True if the dataset was reloaded.
+        """
+        with self.lock:
+            dataset = self.loaded.get(dataset_id)
+        if dataset is None:
+            return False  # Not loaded: the current version is loaded when it is next used
+        try:
+            version, _ = self.source_version(dataset_id)
+        except OSError:
+            return False  # The source file is being replaced; try again later
+        if version == dataset.version:
+            return False
+
+        with self.load_locks[dataset_id]:
+            with self.lock:
+                current = self.loaded.get(dataset_id)
+            if current is None or current.version == version:
+                return False  # Evicted, or already reloaded by another thread
+            try:
+                new_dataset = self._load(dataset_id)
+            except Exception as e:
+                print(f"Error: could not reload dataset '{dataset_id}' ({e}); still serving version {current.version}.")
+                return False
+            changed = bundle_changes(current.bundle, new_dataset.bundle)
+            with self.lock:
+                self.changes[(dataset_id, current.version)] = (new_dataset.version, changed)
+                # Only the most recent reloads of each dataset are remembered
+                recorded = [key for key in self.changes if key[0] == dataset_id]
+                for key in recorded[:-MAX_RECORDED_CHANGES]:
+                    del self.changes[key]
+                self.loaded[dataset_id] = new_dataset
+                self.loaded.move_to_end(dataset_id)
+                self._evict(keep=dataset_id)
+        print(f"Dataset '{dataset_id}' reloaded (version {new_dataset.version}); changed: {', '.join(changed) or 'nothing'}.")
+        return True
+
+    def changed_keys(self, dataset_id, old_version, new_version):
+        """
+        The keys of the bundle that changed between two versions of a dataset (following every reload in between), \
+        or None if this process did not see (or no longer remembers) every one of those reloads (in which case, \
+        anything may have changed).
+        """
+        self.refresh(dataset_id)
+        changed = []
+        version = old_version
+        while version != new_version:
+            with self.lock:
+                step = self.changes.get((dataset_id, version))
+            if step is None:
+                return None
+            version, keys = step
+            changed.extend(key for key in keys if key not in changed)
+        return changed
+
+    def _evict(self, keep):
+        # Evict the least recently used bundles until the loaded bundles fit within the memory budget
+        while self.memory_usage() > self.memory_budget and len(self.loaded) > 1:
+            dataset_id = next(dataset_id for dataset_id in self.loaded if dataset_id != keep)
+            del self.loaded[dataset_id]
+            print(f"Dataset '{dataset_id}' evicted (memory budget exceeded).")
+
+    def memory_usage(self):
+        return sum(dataset.nbytes for dataset in self.loaded.values())
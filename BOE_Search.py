@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+# -------------------------------------------------------------------------------
+# Import additional Python functionality / various libraries
+# -------------------------------------------------------------------------------
+
+import re
+from bisect import bisect_left
+
+"""
+A server-side search index over the series of a data bundle, for the dashboard's component selectors.
+
+With a handful of series, a selector can simply list every option in the page. With thousands of series, \
+that list would dominate the size of the page (and the time the browser takes to render it). Instead, the \
+selectors ask the server for one page of matching options at a time.
+
+Each series is searchable by its (renamed) series name and by the name of its source column in the \
+column_mapping (which carries the series' hierarchy, e.g. "Durable goods: UK Domestic (Sheet_Consumption)").
+Matches are ranked:
+    1. series whose name starts with the query
+    2. series with a word that starts with every word of the query
+    3. series whose name or source column contains the query anywhere (queries of 3 or more characters)
+Within each rank, series keep the order they were given in (e.g. the order the dashboard displays them in).
+
+Every query is answered from indexes built once, when the SeriesIndex is created: sorted lists of the names and \
+of the words (searched by bisection), and the series containing each 3-character sequence (a "trigram"), so a \
+search never scans every series.
+
+Example:
+    index = SeriesIndex(data_bundle['GDP_Components'], data_bundle['column_mapping'])
+    options, total = index.search('capital', page=0, page_size=20)
+"""
+
+# -------------------------------------------------------------------------------
+# Define helper functions that normalise the text being searched
+# -------------------------------------------------------------------------------
+
+def split_words(text):
+    # Lower case words, split on anything that is not a letter or a digit (so "GDP_Component_GFCF" -> gdp, component, gfcf)
+    return [word for word in re.split(r'[^0-9a-z]+', text.lower()) if word]
+
+def search_text(series, source=None):
+    # Everything a series can be found by: its name (as written, and as words) and its source column name
+    return ' '.join([series.lower(), ' '.join(split_words(series)), (source or '').lower()]).strip()
+
+# -------------------------------------------------------------------------------
+# Define the search index
+# -------------------------------------------------------------------------------
+
+class SeriesIndex:
+
+    def __init__(self, series, column_mapping=None):
+        # column_mapping maps source column names to series names (as in "BOE_Data.py"); here it is reversed
+        sources = {renamed: source for source, renamed in (column_mapping or {}).items()}
+        self.series = list(series)
+        self.positions = {name: position for position, name in enumerate(self.series)}
+        self.texts = [search_text(name, sources.get(name)) for name in self.series]
+
+        # The name index: every series name (lower case), sorted, alongside the position of its series
+        names = sorted((name.lower(), position) for position, name in enumerate(self.series))
+        self.names = [name for name, _ in names]
+        self.name_positions = [position for _, position in names]
+
+        # The word index: every distinct word of every series, sorted, alongside the position of its series
+        words = sorted({(word, position) for position, text in enumerate(self.texts) for word in split_words(text)})
+        self.words = [word for word, _ in words]
+        self.word_positions = [position for _, position in words]
+
+        # The trigram index: the positions of the series whose text contains each 3-character sequence
+        self.trigrams = {}
+        for position, text in enumerate(self.texts):
+            for trigram in {text[i:i + 3] for i in range(len(text) - 2)}:
+                self.trigrams.setdefault(trigram, set()).add(position)
+
+    def __len__(self):
+        return len(self.series)
+
+    @staticmethod
+    def _positions_with_prefix(keys, positions, prefix):
+        # The positions of every key starting with "prefix", in a sorted list of keys (a binary search, then a short scan)
+        found = set()
+        i = bisect_left(keys, prefix)
+        while i < len(keys) and keys[i].startswith(prefix):
+            found.add(positions[i])
+            i += 1
+        return found
+
+    def _positions_containing(self, query):
+        # The positions of every series whose text contains the query: the series holding all of its trigrams
+        # (found in the trigram index) are the only candidates, and only those are checked
+        trigrams = {query[i:i + 3] for i in range(len(query) - 2)}
+        candidates = None
+        for trigram in sorted(trigrams, key=lambda trigram: len(self.trigrams.get(trigram, ()))):
+            positions = self.trigrams.get(trigram, set())
+            candidates = positions if candidates is None else candidates & positions
+            if not candidates:
+                return set()
+        return {position for position in candidates if query in self.texts[position]}
+
+    def matches(self, query):
+        # The positions of every series matching the query, best matches first (None means every series, in order)
+        query = (query or '').strip().lower()
+        if not query:
+            return None
+
+        name_prefix = self._positions_with_prefix(self.names, self.name_positions, query)
+        word_prefix = None
+        for word in split_words(query):
+            positions = self._positions_with_prefix(self.words, self.word_positions, word)
+            word_prefix = positions if word_prefix is None else word_prefix & positions
+        word_prefix = (word_prefix or set()) - name_prefix
+        substring = set()
+        if len(query) >= 3:
+            substring = self._positions_containing(query) - name_prefix - word_prefix
+
+        return sorted(name_prefix) + sorted(word_prefix) + sorted(substring)
+
+    def option(self, position):
+        # A dropdown / checklist option for one series.
+        # dcc.Dropdown filters the options it is sent again, in the browser, against their "label" and "search" fields:
+        # "search" carries the same text as the index, so matches on a source column name are not filtered back out.
+        return {'label': self.series[position], 'value': self.series[position], 'search': self.texts[position]}
+
+    def search(self, query=None, page=0, page_size=20):
+        """
+        One page of options matching the query, and the total number of matches.
+        Pages are numbered from 0; a page beyond the last page returns the last page.
+        """
+        matches = self.matches(query)
+        total = len(self.series) if matches is None else len(matches)
+        last_page = max(0, (total - 1) // page_size)
+        page = min(max(0, page), last_page)
+        if matches is None:
+            # No query: the page is simply a slice of the series, in order
+            page_positions = range(page * page_size, min(total, (page + 1) * page_size))
+        else:
+            page_positions = matches[page * page_size:(page + 1) * page_size]
+        return [self.option(position) for position in page_positions], total
+
+    def options_for(self, values):
+        # The options for specific series (e.g. a selector's current value, which must always be displayable)
+        return [self.option(self.positions[value]) for value in values if value in self.positions]
@@ -12,17 +12,37 @@ import pandas as pd
 import numpy as np
 from scipy.stats import zscore
 import pickle
+import cProfile
+import os
+import time
+import tracemalloc
+from bisect import bisect_left, bisect_right, insort
+import openpyxl
 
 # -------------------------------------------------------------------------------
 # Define function that loads and combines worksheets from the source xlsx file
 # -------------------------------------------------------------------------------
 
-def create_combined_dataframe(file_name):
+def create_combined_dataframe(file_name, columns=None):
+    """
+    "columns" (optional) enables PROJECTED ingestion: an iterable of the combined column names \
+    (e.g. 'Other (Sheet_GDP)') that are actually used downstream - typically the keys of column_mapping.
+    Only those columns are read from each sheet, and sheets that contribute none of them are skipped entirely.
+    When "columns" is None, every column of every sheet is loaded (the original behaviour).
+    """
     try:
+        # The "time period" column shall be the index for each dataframe (based on  manual inspection of file)
+        index_column = 'Time period and dataset code row'
+        
         # Obtain list of sheet names from the source Excel file.
         print("Sheet names in the Excel file:")
-        excel_file = pd.ExcelFile(file_name)
-        sheet_names = excel_file.sheet_names
+        if columns is None:
+            excel_file = pd.ExcelFile(file_name)
+            sheet_names = excel_file.sheet_names
+        else:
+            # Projected ingestion streams the workbook (read_only), so only the cells of the wanted columns are ever built
+            workbook = openpyxl.load_workbook(file_name, read_only=True, data_only=True)
+            sheet_names = workbook.sheetnames
         print(sheet_names)
         
         dfs = []  # List to store dataframes from each worksheet
@@ -30,15 +50,22 @@ def create_combined_dataframe(file_name):
         # Iterate through each sheet in the Excel file
         for sheet_name in sheet_names:
             print(f"Processing sheet: {sheet_name}")
-            # Read the worksheet into a pandas dataframe
-            # header = 4 (based on  manual inspection of file)
-            df = pd.read_excel(file_name, sheet_name=sheet_name, header=4)
+            
+            if columns is None:
+                # Read the worksheet into a pandas dataframe (re-using the already opened workbook)
+                # header = 4 (based on  manual inspection of file)
+                df = excel_file.parse(sheet_name=sheet_name, header=4)
+            else:
+                df = read_projected_sheet(workbook[sheet_name], sheet_name, set(columns), index_column)
+                if df is None:
+                    print(f"Sheet {sheet_name} contributes no mapped columns - skipped.")
+                    continue
             
             # Slice off a single, superfluous row from the resulting dataframe (based on manual inspection of file)
             df = df[1:]
             
             # The "time period" column shall be the index for each dataframe (based on  manual inspection of file)
-            df.set_index('Time period and dataset code row', inplace=True)
+            df.set_index(index_column, inplace=True)
             clean_index_name = "TimePeriod"
             df.index.name = clean_index_name
             
@@ -49,6 +76,9 @@ def create_combined_dataframe(file_name):
             dfs.append(df)
             
             print("Dataframe loaded successfully.")
+        
+        if columns is not None:
+            workbook.close()
                 
         # Concatenate all dataframes into a single dataframe
         dfs_combined = pd.concat(dfs, axis=1, join='outer')
@@ -60,6 +90,25 @@ def create_combined_dataframe(file_name):
         print(f"Error loading Excel data: {str(e)}")
         return None
 
+def read_projected_sheet(worksheet, sheet_name, wanted_columns, index_column, header_row=5):
+    """
+    Read only the index column and the wanted columns of one worksheet (header_row = 5, i.e. header = 4 in pandas).
+    Rows are streamed with iter_rows(min_col=..., max_col=...), so cells outside the span of the wanted columns \
+    are skipped by the reader rather than parsed and then thrown away. Returns None if none of the columns are wanted.
+    """
+    header = next(worksheet.iter_rows(min_row=header_row, max_row=header_row, values_only=True), ())
+    wanted = [i for i, col in enumerate(header) if f'{col} (Sheet_{sheet_name})' in wanted_columns]
+    if not wanted or index_column not in header:
+        return None
+    positions = [header.index(index_column)] + wanted
+    first, last = min(positions), max(positions)
+    rows = [[row[i - first] if i - first < len(row) else None for i in positions]
+            for row in worksheet.iter_rows(min_row=header_row + 1, min_col=first + 1, max_col=last + 1, values_only=True)]
+    # Drop trailing empty rows (the reader can report a sheet dimension beyond the last row of data)
+    while rows and all(value is None for value in rows[-1]):
+        rows.pop()
+    return pd.DataFrame(rows, columns=[header[i] for i in positions])
+
 # -------------------------------------------------------------------------------
 # Define function that tidies up the combined dataframe
 # -------------------------------------------------------------------------------
@@ -112,7 +161,7 @@ def rename_columns(df, column_mapping):
 # Define function that creates duplicate dataframes that show values as % change
 # -------------------------------------------------------------------------------
 
-def create_percentage_change_df(df, shift_value):
+def create_percentage_change_df(df, shift_value, rolling_window=40, as_of_state=None):
     
     try:
         # Copy the input DataFrame
@@ -127,6 +176,10 @@ def create_percentage_change_df(df, shift_value):
         # Clip z-score values
         df_copy['Zscore'] = np.clip(df_copy['Zscore'], -4, 4)
         
+        # Add the "as-of" z-scores and percentiles (each quarter judged only against the quarters known at that time).
+        # Given the as-of state of the previous run, only the new quarters are computed (unless the history was revised).
+        df_copy = add_as_of_columns(df_copy, rolling_window, state=as_of_state)
+        
         # Return the resulting DataFrame
         return df_copy
     
@@ -136,3 +189,350 @@ def create_percentage_change_df(df, shift_value):
         
         return None
 
+# -------------------------------------------------------------------------------
+# Define functions that compute "as-of" z-scores and percentiles (expanding and rolling windows)
+# -------------------------------------------------------------------------------
+
+"""
+The full-sample "Zscore" (above) judges every quarter against the whole history - so every historical z-score \
+changes whenever a new quarter is added. An "as-of" statistic judges each quarter only against the quarters that \
+were known at that time (including itself): either every quarter so far (expanding) or the most recent \
+"window" quarters (rolling). Historical values never change when new quarters are added.
+
+as_of_zscores computes the z-scores for every series (column) of a dataframe in a single vectorised pass, and \
+as_of_percentiles the percentiles, from a sorted list of the known values that each quarter is inserted into. \
+The pipeline computes the whole history with these two functions, then keeps a small numeric state in the data \
+bundle ("as_of_state": counts, sums, the sorted known values and the last window of values - plain numbers and \
+arrays), so that a run which only appends quarters computes just the new ones (append_as_of_quarter). \
+A revision to any earlier quarter (which most GDP releases make) falls back to the vectorised pass.
+Z-scores use the population standard deviation (as scipy's zscore does). Percentiles are the percentage of the \
+known values that are less than or equal to the quarter's value. Quarters with fewer than "min_periods" known \
+values in their window have no statistics (NaN).
+"""
+
+def as_of_zscores(df, window=None, min_periods=8, shift=None):
+    """
+    "shift" (optional): a constant subtracted from each series before summing (by default, each series' mean). \
+    It keeps the sums of squares well conditioned, and does not change the z-scores.
+    """
+    values = df.to_numpy(dtype=float)
+    known = ~np.isnan(values)
+    if shift is None:
+        # (Each series' mean, or 0 for a series with no known values)
+        shift = np.nansum(values, axis=0) / np.maximum(known.sum(axis=0), 1)
+    shifted = np.where(known, values - shift, 0.0)
+    
+    # Cumulative counts, sums and sums of squares (with a leading row of zeros), so that the sums over any
+    # window of quarters are the difference of two rows
+    zeros = np.zeros((1, values.shape[1]))
+    cumulative_count = np.vstack([zeros, np.cumsum(known, axis=0)])
+    cumulative_sum = np.vstack([zeros, np.cumsum(shifted, axis=0)])
+    cumulative_sum_sq = np.vstack([zeros, np.cumsum(shifted ** 2, axis=0)])
+    
+    window_end = np.arange(1, len(values) + 1)
+    window_start = np.zeros_like(window_end) if window is None else np.maximum(window_end - window, 0)
+    count = cumulative_count[window_end] - cumulative_count[window_start]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = (cumulative_sum[window_end] - cumulative_sum[window_start]) / count
+        variance = (cumulative_sum_sq[window_end] - cumulative_sum_sq[window_start]) / count - mean ** 2
+        zscores = (shifted - mean) / np.sqrt(np.maximum(variance, 0))
+    
+    zscores[~known | (count < min_periods) | ~np.isfinite(zscores)] = np.nan
+    return pd.DataFrame(zscores, index=df.index, columns=df.columns)
+
+def as_of_percentiles(df, window=None, min_periods=8):
+    values = df.to_numpy(dtype=float)
+    percentiles = np.full(values.shape, np.nan)
+    for j in range(values.shape[1]):
+        # The known values in the current quarter's window, kept sorted: each quarter is inserted (and, once it has
+        # left a rolling window, removed) by bisection, and its percentile is its position in the sorted list
+        known = []
+        for i, value in enumerate(values[:, j]):
+            if window is not None and i >= window and not np.isnan(values[i - window, j]):
+                known.pop(bisect_left(known, values[i - window, j]))
+            if np.isnan(value):
+                continue
+            insort(known, value)
+            if len(known) >= min_periods:
+                percentiles[i, j] = 100 * bisect_right(known, value) / len(known)
+    
+    return pd.DataFrame(percentiles, index=df.index, columns=df.columns)
+
+as_of_columns = ['Zscore_Expanding', 'Zscore_Rolling', 'Percentile_Expanding', 'Percentile_Rolling']
+
+def as_of_statistics(series, rolling_window=40, min_periods=8):
+    # The as-of statistics of every quarter of one series (unclipped), in one vectorised pass: an array with "as_of_columns"
+    frame = series.to_frame()
+    return np.column_stack([
+        as_of_zscores(frame, min_periods=min_periods).iloc[:, 0],
+        as_of_zscores(frame, rolling_window, min_periods).iloc[:, 0],
+        as_of_percentiles(frame, min_periods=min_periods).iloc[:, 0],
+        as_of_percentiles(frame, rolling_window, min_periods).iloc[:, 0]])
+
+def create_as_of_state(series, statistics, rolling_window=40, min_periods=8):
+    # The numeric state that lets append_as_of_quarter extend "statistics" (the as-of statistics of "series")
+    values = series.to_numpy(dtype=float)
+    known = values[~np.isnan(values)]
+    shift = float(known.mean()) if len(known) else 0.0
+    return {
+        'rolling_window': rolling_window,
+        'min_periods': min_periods,
+        'history': values,                        # Every value seen (to detect revisions)
+        'statistics': statistics,                 # The as-of statistics of each of those values
+        'shift': shift,                           # The constant subtracted before summing (see as_of_zscores)
+        'count': int(len(known)),                 # Expanding count, sum and sum of squares (of the shifted values)
+        'sum': float(np.sum(known - shift)),
+        'sum_sq': float(np.sum((known - shift) ** 2)),
+        'sorted_values': np.sort(known),          # Every known value, sorted (for the expanding percentile)
+        'window_values': values[-rolling_window:]}  # The last "rolling_window" values (missing quarters included)
+
+def append_as_of_quarter(state, value):
+    # Add one new quarter to the state (in place), and return its as-of statistics (in the order of "as_of_columns")
+    window = state['rolling_window']
+    state['history'] = np.append(state['history'], value)
+    state['window_values'] = np.append(state['window_values'], value)[-window:]
+    if np.isnan(value):
+        row = np.full(len(as_of_columns), np.nan)
+        state['statistics'] = np.vstack([state['statistics'], row])
+        return row
+    
+    shifted = value - state['shift']
+    state['count'] += 1
+    state['sum'] += shifted
+    state['sum_sq'] += shifted ** 2
+    state['sorted_values'] = np.insert(state['sorted_values'], np.searchsorted(state['sorted_values'], value, 'right'), value)
+    
+    window_values = state['window_values'][~np.isnan(state['window_values'])]
+    window_shifted = window_values - state['shift']
+    windows = [(state['count'], state['sum'], state['sum_sq'], state['sorted_values']),
+               (len(window_values), window_shifted.sum(), (window_shifted ** 2).sum(), np.sort(window_values))]
+    
+    zscores, percentiles = [], []
+    for count, total, total_sq, sorted_values in windows:
+        if count < state['min_periods']:
+            zscores.append(np.nan)
+            percentiles.append(np.nan)
+            continue
+        mean = total / count
+        variance = total_sq / count - mean ** 2
+        with np.errstate(invalid='ignore', divide='ignore'):
+            zscore_value = (shifted - mean) / np.sqrt(max(variance, 0))
+        zscores.append(zscore_value if np.isfinite(zscore_value) else np.nan)
+        percentiles.append(100 * np.searchsorted(sorted_values, value, 'right') / count)
+    
+    row = np.array(zscores + percentiles)
+    state['statistics'] = np.vstack([state['statistics'], row])
+    return row
+
+def add_as_of_columns(df, rolling_window=40, column='GDP_Total_MarketPrices', state=None, min_periods=8):
+    """
+    Add the as-of z-scores (clipped, as the full-sample "Zscore" is) and percentiles of the total GDP growth rate.
+    "state" (optional) is the as-of state kept from the previous run of the pipeline (a dict, see create_as_of_state). \
+    When the new data only appends quarters to the history it has seen, only those quarters are computed; otherwise \
+    every quarter is computed in one vectorised pass. Either way, the state is brought up to date in place.
+    """
+    series = df[column]
+    values = series.to_numpy(dtype=float)
+    seen = len(state['history']) if state else 0
+    appends_only = (bool(state) and state['rolling_window'] == rolling_window and state['min_periods'] == min_periods
+                    and seen <= len(values) and np.array_equal(values[:seen], state['history'], equal_nan=True))
+    
+    if appends_only:
+        for value in values[seen:]:
+            append_as_of_quarter(state, value)
+        print(f"As-of statistics for {column}: {len(values) - seen} new quarters computed.")
+    else:
+        statistics = as_of_statistics(series, rolling_window, min_periods)
+        new_state = create_as_of_state(series, statistics, rolling_window, min_periods)
+        if state is not None:
+            state.clear()
+            state.update(new_state)
+        print(f"As-of statistics for {column}: all {len(values)} quarters computed.")
+    
+    statistics = state['statistics'] if appends_only else new_state['statistics']
+    df = df.copy()
+    for i, name in enumerate(as_of_columns):
+        df[name] = np.clip(statistics[:, i], -4, 4) if name.startswith('Zscore') else statistics[:, i]
+    return df
+
+# -------------------------------------------------------------------------------
+# Define function that precomputes the treemap hierarchy for every quarter
+# -------------------------------------------------------------------------------
+
+def create_treemap_hierarchy(df, parent_mapping):
+    """
+    Precompute the values of every node of the treemap (parents and children) for every quarter, as one compact array.
+    "parent_mapping" maps each component column to its parent (e.g. 'Household_Component_Durables': 'Household_Spend').
+    Node ids follow the "parent/label" convention used by plotly's treemaps, so the values for any quarter can be \
+    swapped into an existing treemap figure without rebuilding it.
+    Only quarters in which every component has a value are included (treemaps cannot represent missing values).
+    """
+    try:
+        components = list(parent_mapping)
+        parents = list(dict.fromkeys(parent_mapping.values()))
+        
+        # Treemaps cannot accept negative values - therefore we must ensure all values are positive
+        df_components = abs(df[components]).dropna()
+        leaf_values = df_components.to_numpy(dtype=float)
+        
+        # Each parent's value is the total of its children's values
+        parent_values = np.column_stack([
+            leaf_values[:, [i for i, component in enumerate(components) if parent_mapping[component] == parent]].sum(axis=1)
+            for parent in parents])
+        
+        # Introduce line breaks in the component labels - to improve the aesthetics of the eventual treemap.
+        leaf_labels = [component.replace('_', '<br>') for component in components]
+        
+        return {
+            'periods': df_components.index,
+            'ids': parents + [f'{parent_mapping[component]}/{label}' for component, label in zip(components, leaf_labels)],
+            'labels': parents + leaf_labels,
+            'parents': [''] * len(parents) + [parent_mapping[component] for component in components],
+            'values': np.hstack([parent_values, leaf_values])}
+    
+    except Exception as e:
+        
+        print(f"An error occurred whilst creating the treemap hierarchy: {e}")
+        
+        return None
+
+# -------------------------------------------------------------------------------
+# Define functions that roll quarterly dataframes up into annual and multi-year periods (for zoomed-out views)
+# -------------------------------------------------------------------------------
+
+def rollup_period_starts(index, years):
+    # The start date of the (annual or multi-year) period each quarter falls into, e.g. 1997 Q3 -> 1995 for 5-year periods
+    return pd.to_datetime((index.year // years * years).astype(str), format='%Y')
+
+def create_rollup_df(df, years):
+    """
+    Roll up a dataframe of LEVELS (e.g. £m per quarter) into periods of "years" years.
+    Levels are averaged, so that the rolled-up values remain in the same units (average £m per quarter) \
+    and a partially complete period (e.g. the current year) remains comparable with complete periods.
+    """
+    try:
+        return df.groupby(rollup_period_starts(df.index, years)).mean().rename_axis(df.index.name)
+    
+    except Exception as e:
+        
+        print(f"An error occurred whilst creating rollup df: {e}")
+        
+        return None
+
+def create_share_rollup_df(df_levels, columns, years):
+    """
+    Roll up SHARES (each column's percentage of the total absolute value of "columns") into periods of "years" years.
+    Shares must not be averaged: they are re-derived from the rolled-up absolute levels, so each quarter is \
+    weighted by its size and the shares of every period still add up to 100%.
+    """
+    try:
+        df_abs = abs(df_levels[columns])
+        df_abs = df_abs.groupby(rollup_period_starts(df_abs.index, years)).sum().rename_axis(df_levels.index.name)
+        return df_abs.div(df_abs.sum(axis=1), axis=0) * 100
+    
+    except Exception as e:
+        
+        print(f"An error occurred whilst creating share rollup df: {e}")
+        
+        return None
+
+def create_rollups(df_GDP, GDP_Components, resolutions):
+    # Build the "pyramid" of rollups: for each resolution (e.g. {'annual': 1, '5_year': 5}), the rolled-up dataframes
+    return {resolution: {'years': years,
+                         'df_GDP': create_rollup_df(df_GDP, years),
+                         'df_GDPComponents_Abs': create_share_rollup_df(df_GDP, GDP_Components, years)}
+            for resolution, years in resolutions.items()}
+
+# -------------------------------------------------------------------------------
+# Define function that adds any missing derived objects to a bundle created by an older "BOE_Data.py"
+# -------------------------------------------------------------------------------
+
+def complete_data_bundle(data_bundle, rollup_resolutions=None, column_mapping=None):
+    data_bundle = dict(data_bundle)
+    rollup_resolutions = rollup_resolutions or {'annual': 1, '5_year': 5, '10_year': 10}  # as in BOE_Data.py
+    
+    # The treemap's values for every quarter (each component's parent is recovered from df_treemap)
+    if data_bundle.get('treemap_hierarchy') is None:
+        df_treemap = data_bundle['df_treemap']
+        treemap_parent_mapping = dict(zip(df_treemap['Component'].str.replace('<br>', '_'), df_treemap['Parent_Component']))
+        data_bundle['treemap_hierarchy'] = create_treemap_hierarchy(data_bundle['df_GDP'], treemap_parent_mapping)
+    
+    # The annual and multi-year rollups of df_GDP and df_GDPComponents_Abs
+    if data_bundle.get('rollups') is None:
+        data_bundle['rollups'] = create_rollups(data_bundle['df_GDP'], data_bundle['GDP_Components'], rollup_resolutions)
+    
+    # The as-of z-scores and percentiles of the growth rates
+    for key in ['df_GDP_QvPriorQ', 'df_GDP_QvPriorY']:
+        if 'Zscore_Expanding' not in data_bundle[key].columns:
+            data_bundle[key] = add_as_of_columns(data_bundle[key])
+    
+    # The column_mapping the bundle was created with (if it is known); without it, series are searchable by name only
+    if data_bundle.get('column_mapping') is None:
+        data_bundle['column_mapping'] = dict(column_mapping or {})
+    
+    return data_bundle
+
+# -------------------------------------------------------------------------------
+# Define a profiler that measures the CPU time and peak memory of each pipeline stage
+# -------------------------------------------------------------------------------
+
+class StageProfiler:
+    """
+    Runs the stages of the data pipeline and (optionally) measures each one.
+    When enabled, every stage reports its CPU time, wall time and peak memory (via tracemalloc).
+    When a profile directory is given, a cProfile file ("<stage>.prof") is also written for every stage; \
+    these files can be inspected with "python -m pstats" or a viewer such as snakeviz.
+    When disabled, stages are simply executed - so the pipeline pays nothing for the profiling switches.
+    """
+
+    def __init__(self, enabled=False, profile_dir=None):
+        self.enabled = enabled or profile_dir is not None
+        self.profile_dir = profile_dir
+        self.results = []  # List of (stage name, CPU seconds, wall seconds, peak memory in bytes)
+
+        if self.profile_dir is not None:
+            os.makedirs(self.profile_dir, exist_ok=True)
+
+    def run(self, stage_name, func, *args, **kwargs):
+        if not self.enabled:
+            return func(*args, **kwargs)
+
+        # Start tracing memory allocations (if not already started), and reset the peak for this stage
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+
+        profile = cProfile.Profile() if self.profile_dir is not None else None
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+
+        try:
+            if profile is not None:
+                profile.enable()
+            return func(*args, **kwargs)
+
+        finally:
+            if profile is not None:
+                profile.disable()
+                profile.dump_stats(os.path.join(self.profile_dir, f"{stage_name}.prof"))
+
+            cpu_seconds = time.process_time() - cpu_start
+            wall_seconds = time.perf_counter() - wall_start
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+            if started_tracing:
+                tracemalloc.stop()
+
+            self.results.append((stage_name, cpu_seconds, wall_seconds, peak_bytes))
+            print(f"Stage '{stage_name}' took {cpu_seconds:.3f}s CPU, {wall_seconds:.3f}s wall, "
+                  f"peak memory {peak_bytes / 1024 ** 2:.1f} MiB.")
+
+    def print_summary(self):
+        if not self.results:
+            return
+
+        print(f"{'Stage':<45}{'CPU (s)':>10}{'Wall (s)':>10}{'Peak (MiB)':>12}")
+        for stage_name, cpu_seconds, wall_seconds, peak_bytes in self.results:
+            print(f"{stage_name:<45}{cpu_seconds:>10.3f}{wall_seconds:>10.3f}{peak_bytes / 1024 ** 2:>12.1f}")
+        if self.profile_dir is not None:
+            print(f"Profile files written to: {self.profile_dir}")
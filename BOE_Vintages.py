@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+# -------------------------------------------------------------------------------
+# Import additional Python functionality / various libraries
+# -------------------------------------------------------------------------------
+
+import os
+import re
+import pickle
+
+import pandas as pd
+import numpy as np
+
+"""
+An append-only store of data "vintages" (i.e. the df_GDP published by each data release).
+
+GDP is revised at every release, but most of the numbers do not change from one release to the next. \
+Rather than keeping a full copy of df_GDP for each release, the store keeps, for each vintage, only the \
+cells that are new or changed versus the previous vintage (a "delta"). Each delta is written once, to its \
+own pickle file, and is never modified afterwards.
+
+The deltas are held in a single "long" dataframe (one row per changed cell) indexed on (Vintage, TimePeriod). \
+From this, any vintage can be reconstructed, two vintages can be compared, and the revision triangle of a \
+series can be produced - without ever holding every full copy of df_GDP in memory.
+
+Example:
+    store = VintageStore('vintage_store')
+    store.append(df_GDP, '2024-03-28')
+    df_GDP_then = store.reconstruct('2023-12-22')
+    triangle = store.revision_triangle('GDP_Total_MarketPrices')
+"""
+
+# -------------------------------------------------------------------------------
+# Define a helper function that converts a (wide) dataframe into "long" format: one row per cell
+# -------------------------------------------------------------------------------
+
+def to_long_format(df):
+    df_long = df.rename_axis(index='TimePeriod', columns='Series').reset_index()
+    df_long = df_long.melt(id_vars='TimePeriod', var_name='Series', value_name='Value')
+    return df_long
+
+# -------------------------------------------------------------------------------
+# Define the vintage store
+# -------------------------------------------------------------------------------
+
+class VintageStore:
+
+    def __init__(self, directory, name='GDP'):
+        self.directory = directory
+        self.name = name
+        self._deltas = None  # All deltas, loaded lazily (see "deltas" below)
+        self._loaded_vintages = []  # The vintages the deltas were loaded from
+        self._series_order = []  # Series names, in the order they were first published
+        os.makedirs(self.directory, exist_ok=True)
+
+    # ---------------------------------------------------------------------------
+    # Vintages on disk
+    # ---------------------------------------------------------------------------
+
+    def _file_name(self, vintage):
+        return os.path.join(self.directory, f"{self.name}_{vintage:%Y-%m-%d}.pickle")
+
+    def vintages(self):
+        # The vintage dates available in the store (read from the file names - no data is loaded)
+        pattern = re.compile(rf"^{re.escape(self.name)}_(\d{{4}}-\d{{2}}-\d{{2}})\.pickle$")
+        dates = [pattern.match(file_name) for file_name in os.listdir(self.directory)]
+        return sorted(pd.Timestamp(match.group(1)) for match in dates if match)
+
+    @property
+    def deltas(self):
+        # Every delta in the store, as one long dataframe indexed (and sorted) on (Vintage, TimePeriod).
+        # The deltas are re-loaded when another process (e.g. "BOE_Data.py") has appended a vintage since.
+        vintages = self.vintages()
+        if self._deltas is None or vintages != self._loaded_vintages:
+            frames = []
+            for vintage in vintages:
+                with open(self._file_name(vintage), 'rb') as f:
+                    frames.append(pickle.load(f))
+            if frames:
+                deltas = pd.concat(frames, ignore_index=True)
+            else:
+                deltas = pd.DataFrame({'Vintage': pd.Series(dtype='datetime64[ns]'),
+                                       'TimePeriod': pd.Series(dtype='datetime64[ns]'),
+                                       'Series': pd.Series(dtype=object),
+                                       'Value': pd.Series(dtype=float)})
+            # Deltas are written column by column, so first appearance gives the original column order
+            self._series_order = list(dict.fromkeys(deltas['Series']))
+            self._deltas = deltas.set_index(['Vintage', 'TimePeriod']).sort_index()
+            self._loaded_vintages = vintages
+        return self._deltas
+
+    # ---------------------------------------------------------------------------
+    # Writing a new vintage
+    # ---------------------------------------------------------------------------
+
+    def append(self, df, vintage):
+        """
+        Add a new vintage to the store. Only the cells that are new or changed versus the latest vintage \
+        are written. Cells that have disappeared (or become blank) are recorded with a NaN value.
+        The store is append-only: the new vintage must be later than every vintage already in the store.
+        """
+        vintage = pd.Timestamp(vintage).normalize()
+        existing = self.vintages()
+        if existing and vintage <= existing[-1]:
+            raise ValueError(f"Vintage {vintage:%Y-%m-%d} is not later than the latest vintage "
+                             f"({existing[-1]:%Y-%m-%d}); the vintage store is append-only.")
+
+        df_new = to_long_format(df)
+        if existing:
+            df_previous = to_long_format(self.reconstruct(existing[-1]))
+            merged = df_new.merge(df_previous, on=['TimePeriod', 'Series'], how='outer',
+                                  suffixes=('', '_previous'))
+            both_blank = merged['Value'].isna() & merged['Value_previous'].isna()
+            changed = (merged['Value'] != merged['Value_previous']) & ~both_blank
+            delta = merged.loc[changed, ['TimePeriod', 'Series', 'Value']]
+        else:
+            # The first vintage is stored in full (blank cells aside)
+            delta = df_new.dropna(subset=['Value'])
+
+        delta = delta.copy()
+        delta.insert(0, 'Vintage', vintage)
+        delta = delta.reset_index(drop=True)
+
+        # Write to a temporary file first, so that a failed write never leaves a half-written vintage behind
+        file_name = self._file_name(vintage)
+        with open(file_name + '.tmp', 'wb') as f:
+            pickle.dump(delta, f)
+        os.replace(file_name + '.tmp', file_name)
+        print(f"Vintage {vintage:%Y-%m-%d} saved: {len(delta)} new or revised values.")
+
+        self._deltas = None  # Reload lazily, next time the deltas are needed
+        return delta
+
+    # ---------------------------------------------------------------------------
+    # Reading vintages back
+    # ---------------------------------------------------------------------------
+
+    def _as_of(self, vintage):
+        # The latest value of every cell, as known at the given vintage (in long format)
+        vintage = pd.Timestamp(vintage).normalize()
+        deltas = self.deltas.loc[:vintage].reset_index()
+        # The deltas are sorted by vintage, so the last row for each cell is the value as at this vintage
+        return deltas.drop_duplicates(subset=['TimePeriod', 'Series'], keep='last')
+
+    def reconstruct(self, vintage):
+        # Rebuild the full (wide) dataframe exactly as it was published at the given vintage
+        as_of = self._as_of(vintage)
+        df = as_of.pivot(index='TimePeriod', columns='Series', values='Value')
+        series_order = [series for series in self._series_order if series in df.columns]
+        df = df.reindex(columns=series_order).dropna(how='all')
+        df.columns.name = None
+        return df
+
+    def revision_triangle(self, series, start=None, end=None):
+        """
+        The revision triangle of a single series: one row per period, one column per vintage.
+        Each cell holds the value of that period as published at that vintage (NaN if not yet published, or since removed).
+        """
+        deltas = self.deltas
+        deltas = deltas[deltas['Series'] == series].reset_index()
+        if start is not None or end is not None:
+            periods = deltas['TimePeriod']
+            deltas = deltas[(periods >= pd.Timestamp(start or periods.min())) &
+                            (periods <= pd.Timestamp(end or periods.max()))]
+
+        # A NaN in a delta means "this value was removed"; it must not be forward-filled over. So, rather than \
+        # forward-filling the values themselves, each cell finds the latest vintage (up to its own) with a delta.
+        values = deltas.pivot(index='TimePeriod', columns='Vintage', values='Value').reindex(columns=self.vintages())
+        published = deltas.assign(Published=1.0).pivot(index='TimePeriod', columns='Vintage', values='Published')
+        published = published.reindex(index=values.index, columns=values.columns)
+        positions = published.mul(np.arange(values.shape[1]), axis=1).ffill(axis=1).to_numpy()
+
+        filled = np.full(values.shape, np.nan)
+        rows, columns = np.nonzero(~np.isnan(positions))
+        filled[rows, columns] = values.to_numpy()[rows, positions[rows, columns].astype(int)]
+        return pd.DataFrame(filled, index=values.index, columns=values.columns)
+
+    def compare(self, old_vintage, new_vintage, series=None):
+        """
+        The revisions between two vintages: one row per (period, series) cell that changed, showing \
+        the old value, the new value and the revision. Only the deltas between the two vintages are examined.
+        """
+        old_vintage = pd.Timestamp(old_vintage).normalize()
+        new_vintage = pd.Timestamp(new_vintage).normalize()
+        if old_vintage >= new_vintage:
+            raise ValueError(f"The old vintage ({old_vintage:%Y-%m-%d}) must be earlier than the new vintage "
+                             f"({new_vintage:%Y-%m-%d}).")
+        deltas = self.deltas
+
+        changed = deltas.loc[old_vintage + pd.Timedelta(days=1):new_vintage].reset_index()
+        if series is not None:
+            series = [series] if isinstance(series, str) else list(series)
+            changed = changed[changed['Series'].isin(series)]
+        changed = changed.drop_duplicates(subset=['TimePeriod', 'Series'], keep='last')
+
+        old_values = self._as_of(old_vintage)[['TimePeriod', 'Series', 'Value']]
+        revisions = changed[['TimePeriod', 'Series', 'Value']].merge(
+            old_values, on=['TimePeriod', 'Series'], how='left', suffixes=('_new', '_old'))
+        old_column, new_column = f'{old_vintage:%Y-%m-%d}', f'{new_vintage:%Y-%m-%d}'
+        revisions = revisions.rename(columns={'Value_old': old_column, 'Value_new': new_column})
+        revisions['Revision'] = revisions[new_column] - revisions[old_column]
+        # Cells revised in between, but back to their original value by the new vintage, are not revisions
+        unchanged = (revisions[old_column] == revisions[new_column]) | \
+                    (revisions[old_column].isna() & revisions[new_column].isna())
+        revisions = revisions[~unchanged]
+        columns = ['TimePeriod', 'Series', old_column, new_column, 'Revision']
+        return revisions[columns].set_index(['TimePeriod', 'Series']).sort_index()
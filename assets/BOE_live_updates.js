@@ -0,0 +1,30 @@
+// Live updates (see "BOE_Live.py"): listen for new bundle versions pushed by the server, and pass each change to the
+// dashboard's "bundle-version" store. The dashboard's callbacks then re-render only the figures whose data changed.
+(function () {
+    if (!window.EventSource) {
+        return;  // No live updates in this browser; the dashboard still works, and shows new data on refresh
+    }
+
+    var seen = null;  // dataset id -> version, as last seen by this page
+    var source = new EventSource('/events');
+
+    source.addEventListener('bundle-version', function (event) {
+        var versions = JSON.parse(event.data);
+        if (seen === null) {
+            seen = versions;  // The first event is the baseline: the versions this page was rendered from
+            return;
+        }
+
+        var updates = [];
+        Object.keys(versions).forEach(function (datasetId) {
+            if (versions[datasetId] !== seen[datasetId]) {
+                updates.push({dataset: datasetId, previous: seen[datasetId], version: versions[datasetId]});
+            }
+        });
+        seen = versions;
+
+        if (updates.length && window.dash_clientside && window.dash_clientside.set_props) {
+            window.dash_clientside.set_props('bundle-version', {data: {updates: updates, versions: versions}});
+        }
+    });
+})();
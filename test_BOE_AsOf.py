@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# -------------------------------------------------------------------------------
+# Tests for the "as-of" z-scores and percentiles: incremental appends against the vectorised pass
+# -------------------------------------------------------------------------------
+
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from BOE_Registry import same_value
+from BOE_Utilities import add_as_of_columns, as_of_columns
+
+def growth_rates(quarters=120, seed=0):
+    # A quarterly growth-rate frame, with the missing first quarter of a percentage change and a gap in the middle
+    rng = np.random.default_rng(seed)
+    values = rng.normal(0.5, 1.0, quarters)
+    values[0] = values[50] = np.nan
+    index = pd.period_range('1990Q1', periods=quarters, freq='Q').to_timestamp()
+    return pd.DataFrame({'GDP_Total_MarketPrices': values}, index=index)
+
+@pytest.mark.parametrize('known', [0, 5, 60, 119])
+def test_incremental_appends_match_the_vectorised_pass(known):
+    df = growth_rates()
+    vectorised = add_as_of_columns(df, rolling_window=40)
+    
+    # Compute the first quarters, then append the rest from the state (as the next run of the pipeline would)
+    state = {}
+    add_as_of_columns(df.iloc[:known], rolling_window=40, state=state)
+    incremental = add_as_of_columns(df, rolling_window=40, state=state)
+    
+    assert len(state['statistics']) == len(df)
+    pd.testing.assert_frame_equal(incremental[as_of_columns], vectorised[as_of_columns], rtol=0, atol=1e-12)
+
+def test_revision_recomputes_every_quarter():
+    df = growth_rates()
+    state = {}
+    add_as_of_columns(df.iloc[:100], rolling_window=40, state=state)
+    
+    revised = df.copy()
+    revised.iloc[10, 0] += 1.0
+    pd.testing.assert_frame_equal(add_as_of_columns(revised, rolling_window=40, state=state),
+                                  add_as_of_columns(revised, rolling_window=40))
+    assert same_value(state['history'], revised['GDP_Total_MarketPrices'].to_numpy())
+
+def test_state_is_plain_data_that_compares_equal_after_reloading():
+    # The state is stored in the data bundle: it must pickle without any class, and an unchanged state must not be
+    # reported as a change when the dashboard reloads the bundle (see "bundle_changes" in BOE_Registry.py)
+    state = {}
+    add_as_of_columns(growth_rates(), rolling_window=40, state=state)
+    reloaded = pickle.loads(pickle.dumps(state))
+    assert b'BOE_' not in pickle.dumps(state)
+    assert same_value(state, reloaded)
@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# -------------------------------------------------------------------------------
+# Tests for the choice of resolution (quarterly, annual or multi-year rollup) of the plots of levels and shares
+# -------------------------------------------------------------------------------
+
+import pytest
+
+import BOE_Dash
+
+dataset = BOE_Dash.default_dataset
+years = dataset['df_GDP'].index.year
+first_year, last_year = int(min(years)), int(max(years))
+
+def reachable_resolutions(max_bars):
+    # Every resolution chosen for some range of years within the data, at the given bar budget
+    return {BOE_Dash.select_resolution(dataset, start, end, max_bars)[0]
+            for start in range(first_year, last_year + 1) for end in range(start, last_year + 1)}
+
+def test_every_rollup_level_can_be_selected():
+    # With a budget of 10 bars, each of quarterly, annual, 5-year and 10-year is used for some range of years
+    assert reachable_resolutions(10) == {None} | set(dataset['rollups'])
+
+def test_default_budget_selects_quarterly_then_annual():
+    assert BOE_Dash.select_resolution(dataset, 1990, 2023) == (None, 'Quarterly')
+    assert BOE_Dash.select_resolution(dataset, first_year, last_year) == ('annual', 'Annual')
+
+@pytest.mark.parametrize('max_bars', [10, 40, 160])
+def test_plots_fit_within_the_budget(max_bars):
+    # Whatever resolution is chosen, the sliced dataframe has no more bars than the budget allows
+    for start in range(first_year, last_year + 1, 3):
+        df, _ = BOE_Dash.slice_years(dataset, 'df_GDP', str(start), str(last_year), max_bars=max_bars)
+        assert 0 < len(df) <= max_bars
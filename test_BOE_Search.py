@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# -------------------------------------------------------------------------------
+# Tests for the server-side search of the GDP component dropdown, through the Dash callback endpoint
+# -------------------------------------------------------------------------------
+
+import BOE_Dash
+
+def search_components(search_value, selected='GDP_Component_Household_Spend'):
+    # POST the request dash-renderer sends when the user types into the dropdown, and return the options sent back
+    inputs = [{'id': 'Buttons_Components', 'property': 'search_value', 'value': search_value},
+              {'id': 'Buttons_Components', 'property': 'value', 'value': selected},
+              {'id': 'dataset-dropdown', 'property': 'value', 'value': BOE_Dash.default_dataset.id}]
+    payload = {'output': 'Buttons_Components.options',
+               'outputs': {'id': 'Buttons_Components', 'property': 'options'},
+               'inputs': inputs, 'state': [],
+               'changedPropIds': ['Buttons_Components.search_value']}
+    response = BOE_Dash.app.server.test_client().post('/_dash-update-component', json=payload)
+    assert response.status_code == 200
+    return response.get_json()['response']['Buttons_Components']['options']
+
+def test_search_matches_source_column_names():
+    # "capital" only appears in the source columns of GFCF and Inventories (see column_mapping in "BOE_Data.py")
+    options = search_components('capital')
+    values = [option['value'] for option in options]
+    assert 'GDP_Component_GFCF' in values and 'GDP_Component_Inventories' in values
+    # ...and each match carries that text in "search", so the browser's own filtering keeps it
+    for option in options:
+        if option['value'] != 'GDP_Component_Household_Spend':
+            assert 'capital' in option['search']
+
+def test_selected_component_is_always_included():
+    values = [option['value'] for option in search_components('capital')]
+    assert values[0] == 'GDP_Component_Household_Spend'